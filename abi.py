@@ -0,0 +1,493 @@
+"""
+.. _lib.blockchain.ethereum.abi:
+.. module:: abi
+
+***
+ABI
+***
+
+This module implements the `Ethereum Contract ABI <https://docs.soliditylang.org/en/latest/abi-spec.html>`_ encoding of function arguments
+and the decoding of return values.
+
+Argument types are compiled once into an encoding plan: a tree of plain tuples that can be stored and reused for every call,
+so that no type string is parsed while encoding. Encoding is performed in two passes, the first one computing the exact size
+of the result and the second one writing heads and tails in place into a single preallocated buffer. ::
+
+    from blockchain.ethereum import abi
+
+    plan = abi.compile(("address","uint256[]","string"))
+    data = abi.encode(plan, ("0xde9F276DDff83727fB627D2C0728b5bAeA469373", (1,2,3), "hello"))
+
+Supported types are :code:`uint<M>`, :code:`int<M>`, :code:`address`, :code:`bool`, :code:`bytes<M>`, :code:`bytes`, :code:`string`,
+fixed and dynamic arrays :code:`T[k]`, :code:`T[]` and tuples :code:`(T1,T2,...)`.
+
+The same plans are used to decode return values from a binary buffer in a single pass: ::
+
+    plan = abi.compile(("uint256","string"))
+    jackpot, name = abi.decode(plan, ecc.hex_to_bin(result[2:]))
+
+Values can be given as:
+
+* integers, hexadecimal strings starting with 0x or big endian bytes for :code:`uint<M>` and :code:`int<M>`
+* hexadecimal strings starting with 0x or bytes for :code:`address`, :code:`bytes<M>` and :code:`bytes`
+* strings or bytes for :code:`string`
+* lists or tuples for arrays and tuples
+
+Decoded values are returned as:
+
+* integers for :code:`uint<M>` and :code:`int<M>`; values not fitting a native integer are returned as :samp:`bignum.BigNum`
+* lowercase hexadecimal strings starting with 0x for :code:`address`
+* booleans for :code:`bool`
+* bytes for :code:`bytes<M>` and :code:`bytes`, strings for :code:`string`
+* lists for arrays and tuples for tuples
+
+    """
+
+from crypto.ecc import ecc as ecc
+from bignum import bignum
+
+# plan node kinds
+UINT    = 0
+INT     = 1
+ADDRESS = 2
+BOOL    = 3
+FBYTES  = 4
+BYTES   = 5
+STRING  = 6
+ARRAY   = 7
+FARRAY  = 8
+TUPLE   = 9
+
+# a plan node is a tuple (kind, dynamic, head size, arg, count):
+# arg is the size in bits or bytes for elementary types, the element node for arrays and the tuple of nodes for tuples;
+# count is the length of fixed arrays
+
+def _split(types):
+    # split a comma separated list of types at the top nesting level
+    res = []
+    depth = 0
+    start = 0
+    for i in range(len(types)):
+        c = types[i]
+        if c=="(":
+            depth+=1
+        elif c==")":
+            depth-=1
+        elif c=="," and not depth:
+            res.append(types[start:i])
+            start = i+1
+    if start<len(types):
+        res.append(types[start:])
+    return res
+
+def _size_of(name,prefix,default):
+    # parse the M in uint<M>, int<M>, bytes<M>
+    if len(name)==len(prefix):
+        return default
+    return int(name[len(prefix):])
+
+def _parse(t):
+    t = t.strip()
+    if t.endswith("]"):
+        pos = t.rfind("[")
+        elem = _parse(t[:pos])
+        dim = t[pos+1:-1]
+        if not dim:
+            return (ARRAY,True,32,elem,0)
+        k = int(dim)
+        if elem[1]:
+            return (FARRAY,True,32,elem,k)
+        return (FARRAY,False,elem[2]*k,elem,k)
+    if t.startswith("("):
+        nodes = tuple([_parse(x) for x in _split(t[1:-1])])
+        return _tuple_node(nodes)
+    if t=="address":
+        return (ADDRESS,False,32,20,0)
+    if t=="bool":
+        return (BOOL,False,32,1,0)
+    if t=="string":
+        return (STRING,True,32,0,0)
+    if t=="bytes":
+        return (BYTES,True,32,0,0)
+    if t.startswith("uint"):
+        bits = _size_of(t,"uint",256)
+        if bits>0 and bits<=256 and bits%8==0:
+            return (UINT,False,32,bits,0)
+    elif t.startswith("int"):
+        bits = _size_of(t,"int",256)
+        if bits>0 and bits<=256 and bits%8==0:
+            return (INT,False,32,bits,0)
+    elif t.startswith("bytes"):
+        n = _size_of(t,"bytes",0)
+        if n>0 and n<=32:
+            return (FBYTES,False,32,n,0)
+    raise UnsupportedError
+
+def _tuple_node(nodes):
+    head = 0
+    for node in nodes:
+        if node[1]:
+            return (TUPLE,True,32,nodes,0)
+        head+=node[2]
+    return (TUPLE,False,head,nodes,0)
+
+def compile(types):
+    """
+.. function:: compile(types)
+
+    :param types: a tuple of ABI type strings
+
+    Return the encoding plan for a list of values of types *types*. Raise :samp:`UnsupportedError` for unknown types.
+
+    """
+    return _tuple_node(tuple([_parse(t) for t in types]))
+
+def subplan(plan,select):
+    """
+.. function:: subplan(plan,select)
+
+    :param plan: a plan returned by :func:`compile`
+    :param select: a tuple of booleans, one for each type of *plan*
+
+    Return the plan of the types of *plan* whose flag in *select* is True (i.e. the non indexed parameters of an event).
+
+    """
+    return _tuple_node(tuple([plan[3][i] for i in range(len(select)) if select[i]]))
+
+def is_elementary(plan,idx):
+    """
+.. function:: is_elementary(plan,idx)
+
+    Return True if the type at index *idx* of *plan* is elementary (:code:`uint<M>`, :code:`int<M>`, :code:`address`, :code:`bool`, :code:`bytes<M>`).
+
+    """
+    return plan[3][idx][0]<=FBYTES
+
+def canonical(t):
+    """
+.. function:: canonical(t)
+
+    :param t: an ABI type string
+
+    Return the canonical form of *t* used to compute function selectors (i.e. :code:`uint` becomes :code:`uint256`).
+
+    """
+    t = t.strip()
+    if t.endswith("]"):
+        pos = t.rfind("[")
+        return canonical(t[:pos])+t[pos:]
+    if t.startswith("("):
+        return "("+",".join([canonical(x) for x in _split(t[1:-1])])+")"
+    if t=="uint" or t=="int":
+        return t+"256"
+    return t
+
+def signature(name,types):
+    """
+.. function:: signature(name,types)
+
+    Return the canonical signature of function (or event) *name* with argument types *types* (i.e. :code:`transfer(address,uint256)`).
+
+    """
+    return name+"("+",".join([canonical(t) for t in types])+")"
+
+
+def param_type(param):
+    """
+.. function:: param_type(param)
+
+    :param param: an input or output parameter of a JSON ABI entry, as a dictionary
+
+    Return the ABI type string of *param*, expanding tuple components (i.e. :code:`(uint256,address)[]`).
+
+    """
+    t = param["type"]
+    if t.startswith("tuple"):
+        return "("+",".join([param_type(c) for c in param["components"]])+")"+t[5:]
+    return t
+
+def _to_bin(value):
+    if type(value)==PSTRING and value.startswith("0x"):
+        value = value[2:]
+        if len(value)%2:
+            value = "0"+value
+        return ecc.hex_to_bin(value)
+    return value
+
+def _pad(n):
+    return (n+31)//32*32
+
+def _size(node,value):
+    # full encoded size of value (head only for static nodes)
+    kind = node[0]
+    if not node[1]:
+        return node[2]
+    if kind==BYTES:
+        return 32+_pad(len(_to_bin(value)))
+    if kind==STRING:
+        return 32+_pad(len(value))
+    if kind==ARRAY:
+        return 32+_seq_size(node[3],None,value)
+    if kind==FARRAY:
+        return _seq_size(node[3],None,value)
+    return _seq_size(None,node[3],value)
+
+def _seq_size(elem,nodes,values):
+    # size of a sequence of values, either all of type elem or of types nodes
+    l = 0
+    for i in range(len(values)):
+        node = elem if nodes is None else nodes[i]
+        if node[1]:
+            l+=32+_size(node,values[i])
+        else:
+            l+=node[2]
+    return l
+
+def _write_int(buf,end,value):
+    # write the native integer value as the 32 bytes word ending at end, two's complement if negative
+    if value<0:
+        for i in range(end-32,end):
+            buf[i] = 0xff
+    i = end-1
+    while value!=0 and value!=-1:
+        buf[i] = value&0xff
+        value = value>>8
+        i-=1
+
+def _check_int(kind,bits,value):
+    # raise ValueError if the native integer value is out of range for uint<bits>/int<bits>
+    if kind==UINT:
+        if value<0 or (bits<64 and value>>bits):
+            raise ValueError
+    elif bits<64:
+        value = value>>(bits-1)
+        if value!=0 and value!=-1:
+            raise ValueError
+
+def _write_right(buf,end,data):
+    n = len(data)
+    if n>32:
+        raise ValueError
+    buf[end-n:end] = data
+
+def _write(node,value,buf,ofs):
+    # write value at ofs, return the offset of the first byte after it
+    kind = node[0]
+    if kind==UINT or kind==INT:
+        if type(value)==PSTRING and not value.startswith("0x"):
+            value = int(value)
+        if type(value)==PSMALLINT or type(value)==PINTEGER:
+            _check_int(kind,node[3],value)
+            _write_int(buf,ofs+32,value)
+        else:
+            value = _to_bin(value)
+            if len(value)>node[3]//8:
+                raise ValueError
+            _write_right(buf,ofs+32,value)
+        return ofs+32
+    if kind==ADDRESS:
+        _write_right(buf,ofs+32,_to_bin(value))
+        return ofs+32
+    if kind==BOOL:
+        if value:
+            buf[ofs+31] = 1
+        return ofs+32
+    if kind==FBYTES:
+        value = _to_bin(value)
+        if len(value)>node[3]:
+            raise ValueError
+        buf[ofs:ofs+len(value)] = value
+        return ofs+32
+    if kind==BYTES or kind==STRING:
+        if kind==BYTES:
+            # strings are encoded as given, even if starting with 0x
+            value = _to_bin(value)
+        _write_int(buf,ofs+32,len(value))
+        ofs+=32
+        buf[ofs:ofs+len(value)] = value
+        return ofs+_pad(len(value))
+    if kind==ARRAY:
+        _write_int(buf,ofs+32,len(value))
+        return _write_seq(node[3],None,value,buf,ofs+32)
+    if kind==FARRAY:
+        if len(value)!=node[4]:
+            raise ValueError
+        return _write_seq(node[3],None,value,buf,ofs)
+    if len(value)!=len(node[3]):
+        raise ValueError
+    return _write_seq(None,node[3],value,buf,ofs)
+
+def _write_seq(elem,nodes,values,buf,ofs):
+    # heads first, then tails of dynamic values; offsets are relative to the start of the sequence
+    head = ofs
+    tail = ofs
+    for i in range(len(values)):
+        node = elem if nodes is None else nodes[i]
+        tail+=node[2]
+    for i in range(len(values)):
+        node = elem if nodes is None else nodes[i]
+        if node[1]:
+            _write_int(buf,head+32,tail-ofs)
+            tail = _write(node,values[i],buf,tail)
+            head+=32
+        else:
+            head = _write(node,values[i],buf,head)
+    return tail
+
+def encoded_size(plan,values):
+    """
+.. function:: encoded_size(plan,values)
+
+    Return the size in bytes of the encoding of *values* according to *plan*.
+
+    """
+    return _seq_size(None,plan[3],values)
+
+def encode_into(plan,values,buf,offset=0):
+    """
+.. function:: encode_into(plan,values,buf,offset=0)
+
+    :param plan: an encoding plan returned by :func:`compile`
+    :param values: a tuple of values, one for each type of the plan
+    :param buf: a zero filled bytearray receiving the encoding
+    :param offset: position in *buf* where the encoding starts
+
+    Write the ABI encoding of *values* into *buf* starting at *offset* and return the offset of the first byte after it.
+    Only non zero bytes are written: the area of *buf* receiving the encoding must be zero filled.
+
+    """
+    if len(values)!=len(plan[3]):
+        raise ValueError
+    return _write_seq(None,plan[3],values,buf,offset)
+
+def encode(plan,values,selector=None):
+    """
+.. function:: encode(plan,values,selector=None)
+
+    :param plan: an encoding plan returned by :func:`compile`
+    :param values: a tuple of values, one for each type of the plan
+    :param selector: optional 4 bytes function selector to prepend to the result
+
+    Return a bytearray with the ABI encoding of *values* (the calldata of a function call when *selector* is given).
+    Raise :samp:`ValueError` if a value does not fit its type (i.e. 300 for :code:`uint8` or a negative :code:`uint<M>`).
+
+    """
+    if len(values)!=len(plan[3]):
+        raise ValueError
+    ofs = 0
+    if selector is not None:
+        ofs = len(selector)
+    buf = bytearray(ofs+_seq_size(None,plan[3],values))
+    if ofs:
+        buf[0:ofs] = selector
+    _write_seq(None,plan[3],values,buf,ofs)
+    return buf
+
+
+def _read_uint(buf,ofs):
+    # native integer in the 32 bytes word at ofs, or None if it does not fit
+    for i in range(ofs,ofs+24):
+        if buf[i]:
+            return None
+    if buf[ofs+24]>=0x80:
+        return None
+    x = 0
+    for i in range(ofs+24,ofs+32):
+        x = (x<<8)|buf[i]
+    return x
+
+def _read_int(buf,ofs):
+    if buf[ofs]<0x80:
+        return _read_uint(buf,ofs)
+    for i in range(ofs,ofs+24):
+        if buf[i]!=0xff:
+            return None
+    if buf[ofs+24]<0x80:
+        return None
+    x = -1
+    for i in range(ofs+24,ofs+32):
+        x = (x<<8)|buf[i]
+    return x
+
+def _read_bigint(buf,ofs):
+    # BigNum for a negative int256 word not fitting a native integer: 0 - two's complement magnitude
+    mag = bytearray(32)
+    carry = 1
+    i = 31
+    while i>=0:
+        x = (buf[ofs+i]^0xff)+carry
+        mag[i] = x&0xff
+        carry = x>>8
+        i-=1
+    return bignum.BigNum(0).sub(bignum.BigNum("0x"+ecc.bin_to_hex(mag)))
+
+def _read_len(buf,ofs):
+    x = _read_uint(buf,ofs)
+    if x is None or x>len(buf):
+        raise ValueError
+    return x
+
+def _read(node,buf,ofs,base):
+    # decode the value whose head is at ofs; offsets of dynamic values are relative to base
+    kind = node[0]
+    if ofs+32>len(buf):
+        raise ValueError
+    if node[1]:
+        ofs = base+_read_len(buf,ofs)
+        if ofs+32>len(buf):
+            raise ValueError
+    if kind==UINT:
+        x = _read_uint(buf,ofs)
+        if x is None:
+            x = bignum.BigNum("0x"+ecc.bin_to_hex(buf[ofs:ofs+32]))
+        return x
+    if kind==INT:
+        x = _read_int(buf,ofs)
+        if x is None:
+            if buf[ofs]<0x80:
+                x = bignum.BigNum("0x"+ecc.bin_to_hex(buf[ofs:ofs+32]))
+            else:
+                x = _read_bigint(buf,ofs)
+        return x
+    if kind==ADDRESS:
+        return "0x"+ecc.bin_to_hex(buf[ofs+12:ofs+32]).lower()
+    if kind==BOOL:
+        return buf[ofs+31]!=0
+    if kind==FBYTES:
+        return bytes(buf[ofs:ofs+node[3]])
+    if kind==BYTES or kind==STRING:
+        n = _read_len(buf,ofs)
+        ofs+=32
+        if ofs+n>len(buf):
+            raise ValueError
+        if kind==STRING:
+            return str(buf[ofs:ofs+n])
+        return bytes(buf[ofs:ofs+n])
+    if kind==ARRAY:
+        n = _read_len(buf,ofs)
+        return _read_seq(node[3],None,n,buf,ofs+32)
+    if kind==FARRAY:
+        return _read_seq(node[3],None,node[4],buf,ofs)
+    return tuple(_read_seq(None,node[3],len(node[3]),buf,ofs))
+
+def _read_seq(elem,nodes,n,buf,ofs):
+    res = []
+    head = ofs
+    for i in range(n):
+        node = elem if nodes is None else nodes[i]
+        res.append(_read(node,buf,head,ofs))
+        head+=32 if node[1] else node[2]
+    return res
+
+def decode(plan,buf,offset=0):
+    """
+.. function:: decode(plan,buf,offset=0)
+
+    :param plan: a decoding plan returned by :func:`compile`
+    :param buf: bytes, bytearray or memoryview with the ABI encoded values (i.e. the binary result of :samp:`eth_call`)
+    :param offset: position in *buf* where the encoded values start
+
+    Return a tuple with the values of the types of *plan* decoded from *buf*. Raise :samp:`ValueError` if *buf* is malformed.
+
+    """
+    return tuple(_read_seq(None,plan[3],len(plan[3]),buf,offset))
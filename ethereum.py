@@ -49,15 +49,22 @@ The following constants are defined:
 * :samp:`ROPSTEN`, identifier of the ropsten network
 * :samp:`RINKEBY`, identifier of the rinkeby network
 * :samp:`KOVAN`, identifier of the kovan network
+* :samp:`ACCESS_LIST_TX`, type of EIP-2930 transactions
+* :samp:`DYNAMIC_FEE_TX`, type of EIP-1559 transactions
+
+Addresses derived by :func:`get_address` and checksummed by :func:`get_checksum_address` are kept in small LRU caches,
+which can be resized with :func:`set_address_cache`.
 
 
     """
 
+import json
 from crypto.ecc import ecc as ecc
 from crypto.hash import keccak as keccak
 from crypto.hash import sha2 as sha2
 from bignum import bignum
 from blockchain.ethereum import rlp
+from blockchain.ethereum import abi
 
 WEI    = 0
 KWEI   = 3
@@ -67,11 +74,59 @@ SZABO  = 12
 FINNEY = 15
 ETHER  = 18
 
+ACCESS_LIST_TX = 1
+DYNAMIC_FEE_TX = 2
+
 MAIN    = 1
 ROPSTEN = 3
 RINKEBY = 4
 KOVAN = 42
 
+class _LRU():
+    # small least recently used map, size 0 disables it
+    def __init__(self,size):
+        self.resize(size)
+
+    def resize(self,size):
+        self.size = size
+        self._keys = []
+        self._entries = {}
+
+    def get(self,key):
+        if key in self._entries:
+            self._keys.remove(key)
+            self._keys.append(key)
+            return self._entries[key]
+        return None
+
+    def put(self,key,value):
+        if not self.size:
+            return
+        if key in self._entries:
+            self._keys.remove(key)
+        elif len(self._keys)>=self.size:
+            del self._entries[self._keys.pop(0)]
+        self._keys.append(key)
+        self._entries[key] = value
+
+# derived addresses by private key and checksummed addresses by address
+_addresses = _LRU(4)
+_checksums = _LRU(32)
+
+def set_address_cache(addresses=4,checksums=32):
+    """
+.. function:: set_address_cache(addresses=4,checksums=32)
+
+    :param addresses: maximum number of private keys whose address is cached by :func:`get_address`
+    :param checksums: maximum number of addresses whose checksummed form is cached by :func:`get_checksum_address`
+
+    Resize (and empty) the caches used by :func:`get_address` and :func:`get_checksum_address`; a size of 0 disables the cache.
+    Both caches evict the least recently used entry when full.
+
+    """
+    _addresses.resize(addresses)
+    _checksums.resize(checksums)
+
 def get_address(pv):
     """
 .. function::get_address(pv)
@@ -79,18 +134,51 @@ def get_address(pv):
     Given the private key *pv*, return the corresponding Ethereum address
     *pv* can be given in both binary or hex format (starting with 0x)
 
+    The address of the most recently used keys is cached (see :func:`set_address_cache`).
+
     """
-    if pv.startswith("0x"):
-        pv = ecc.hex_to_bin(pv)
+    pv = bytes(_bin_key(pv))
+    addr = _addresses.get(pv)
+    if addr is not None:
+        return addr
     pbb = ecc.derive_public_key(ecc.SECP256K1,pv)
-    pb = ecc.bin_to_hex(pbb)
     kk = keccak.Keccak()
     kk.update(pbb)
-    dk = kk.hexdigest()
+    addr = "0x"+ecc.bin_to_hex(kk.digest()[12:]).lower()
+    _addresses.put(pv,addr)
+    return addr
+
+_A_LOWER = __ORD('a')
+_F_LOWER = __ORD('f')
+_A_UPPER = __ORD('A')
+_F_UPPER = __ORD('F')
+_ZERO = __ORD('0')
+_NINE = __ORD('9')
+
+def _is_hex(baddr):
+    for b in baddr:
+        if b>=_A_LOWER and b<=_F_LOWER:
+            continue
+        if (b<_ZERO or b>_NINE) and (b<_A_UPPER or b>_F_UPPER):
+            return False
+    return True
+
+def _checksum(baddr):
+    # apply the EIP-55 checksum in place to the lowercase hex address baddr (without 0x)
+    kk = keccak.Keccak()
+    kk.update(baddr)
     db = kk.digest()
-    addr = dk[-40:].lower()
-    return "0x"+addr
-
+    for i in range(len(baddr)):
+        b = baddr[i]
+        if b>=_A_LOWER and b<=_F_LOWER:
+            # nibble i of the digest, uppercase if >= 8
+            if i&1:
+                up = db[i>>1]&0x08
+            else:
+                up = db[i>>1]&0x80
+            if up:
+                baddr[i] = b-32
+    return baddr
 
 def get_checksum_address(addr):
     """
@@ -98,74 +186,110 @@ def get_checksum_address(addr):
 
     Given the the Ethereum address *addr*, return the checksummed address according to `EIP 55<https://github.com/ethereum/EIPs/blob/master/EIPS/eip-55.md>`_
 
+    The checksummed form of the most recently used addresses is cached (see :func:`set_address_cache`).
+
     """
-    if addr.startswith("0x"):
-        addr = addr[2:]
-    kk = keccak.Keccak()
-    kk.update(addr)
-    vv = bytes(kk.hexdigest())
-    baddr = bytearray(addr)
-    for i,b in enumerate(baddr):
-        if b>=__ORD('a') and b<=__ORD('f'):
-            v = vv[i]
-            if v>=__ORD('8'):
-                baddr[i]=__ORD('A')+ (b-__ORD('a'))
-    return "0x"+str(baddr)
+    res = _checksums.get(addr)
+    if res is not None:
+        return res
+    hexaddr = addr[2:] if addr.startswith("0x") else addr
+    res = "0x"+str(_checksum(bytearray(hexaddr.lower())))
+    _checksums.put(addr,res)
+    return res
 
+def validate_checksum_addresses(addresses):
+    """
+.. function::validate_checksum_addresses(addresses)
 
-# secp256k1 N
-N = "115792089237316195423570985008687907852837564279074904382605163141518161494337"
+    :param addresses: a list of Ethereum addresses in hex format, with or without 0x
 
-def _pad32(topad):
-    if topad.startswith('0x'):
-        topad = topad[2:]
-    return '0'*(64-len(topad)) + topad
+    Return a list of booleans, True for every address of *addresses* matching its `EIP 55<https://github.com/ethereum/EIPs/blob/master/EIPS/eip-55.md>`_ checksum.
+    Each address is hashed once and compared as a whole with its checksummed form, without going through :func:`get_checksum_address`.
+    Addresses that are not made of exactly 40 hexadecimal digits are reported as False. Addresses without checksum (all lowercase)
+    are reported as False too, unless no letter of the checksummed form is uppercase (i.e. an address made of digits only).
 
+    """
+    res = []
+    for addr in addresses:
+        if addr.startswith("0x"):
+            addr = addr[2:]
+        baddr = bytearray(addr)
+        if len(baddr)!=40 or not _is_hex(baddr):
+            res.append(False)
+            continue
+        res.append(_checksum(bytearray(addr.lower()))==baddr)
+    return res
+
+
+# largest native integer
+_MAX_INT = 0x7fffffffffffffff
+
+# cached 10**unit multipliers
+_UNIT_MUL = {}
+
+def _unit_multiplier(unit):
+    # return 10**unit, or 0 if it does not fit a native integer
+    if unit in _UNIT_MUL:
+        return _UNIT_MUL[unit]
+    mul = 0
+    if unit>=0 and unit<=18:
+        mul = 1
+        for i in range(unit):
+            mul*=10
+    _UNIT_MUL[unit] = mul
+    return mul
+
+def _strip_zeros(value):
+    i = 0
+    while i<len(value) and value[i]==0:
+        i+=1
+    if i:
+        return value[i:]
+    return value
+
+def _hex_to_min_bin(value):
+    # hex string without 0x to big endian bytes without leading zeros
+    i = 0
+    while i<len(value) and value[i]=="0":
+        i+=1
+    value = value[i:]
+    if not value:
+        return b''
+    if len(value)%2:
+        value = "0"+value
+    return ecc.hex_to_bin(value)
 
-# _supported_types = ('address', 'uint8', 'uint16', 'uint32')
-def _in_uint_range(check_type):
-    size = 256 if check_type == "uint" else int(check_type[4:])
-    return size > 0 and size <= 256 and size % 8 == 0
+# secp256k1 N
+N = "115792089237316195423570985008687907852837564279074904382605163141518161494337"
 
+def supported_type(check_type):
+    """
+.. function::supported_type(check_type)
 
-def _in_int_range(check_type):
-    size = int(check_type[3:])
-    return size > 0 and size <= 256 and size % 8 == 0
+    Return True if *check_type* is an ABI type supported by :meth:`Contract.register_function`.
 
+    """
+    try:
+        abi.compile((check_type,))
+    except Exception as e:
+        return False
+    return True
 
-def _in_bytes_range(check_type):
-    size = int(check_type[5:])
-    return size > 0 and size <= 32
+class _Hash():
+    # memoized Keccak of an encoded transaction, with the digest/hexdigest interface of a hash instance
+    __slots__ = ("_digest",)
 
+    def __init__(self,data):
+        kk = keccak.Keccak()
+        kk.update(data)
+        self._digest = kk.digest()
 
-_supported_types = (
-    'address',
-    ('uint',_in_uint_range),
-    ('int',_in_int_range),
-    ('bytes', _in_bytes_range)
-)
-def supported_type(check_type):
-    for _supp_type in _supported_types:
-        if (
-            type(_supp_type) == PTUPLE and
-            check_type.startswith(_supp_type[0]) and
-            _supp_type[1](check_type)
-        ):
-            return True
-        elif type(_supp_type) != PTUPLE and check_type == _supp_type:
-            return True
-    return False
+    def digest(self):
+        return self._digest
+
+    def hexdigest(self):
+        return ecc.bin_to_hex(self._digest)
 
-def convert(arg_type, arg):
-    if arg_type.startswith('uint'):
-        return hex(int(arg))
-    elif arg_type.startswith('int'):
-        size = int(arg_type[3:])
-        return hex(2**size + int(arg)) if arg < 0 else hex(int(arg))
-    elif arg_type.startswith('bytes'):
-        return ''.join([hex(int(x), prefix='') for x in bytes(arg)])
-    else:
-        raise UnsupportedError
 
 class Transaction():
     """
@@ -187,11 +311,33 @@ Transaction class
     * transaction nonce
 
    Optionally, transaction data and network id can be set.
+
+   This class implements legacy transactions: see :class:`AccessListTransaction` and :class:`DynamicFeeTransaction` for typed transactions.
+
+   The signing payload, the RLP representation and both hashes are computed once and memoized until a field is changed
+   through one of the :samp:`set_*` methods (fields modified directly in :samp:`tx` are not tracked).
     """
+    __slots__ = ("tx","chain","_payload","_signing_hash","_rlp","_tx_hash")
+
+    # positions of the fields in self.tx
+    _NONCE     = 0
+    _GAS_PRICE = 1
+    _GAS_LIMIT = 2
+    _TO        = 3
+    _VALUE     = 4
+    _DATA      = 5
+
     def __init__(self,chain=MAIN):
-        self .tx = [b'',b'',b'',b'',b'',b'',b'',b'',b'']
+        self.tx = [b'',b'',b'',b'',b'',b'',b'',b'',b'']
         self.set_chain(chain)
 
+    def _changed(self):
+        # a field changed: drop memoized encodings and hashes
+        self._payload = None
+        self._signing_hash = None
+        self._rlp = None
+        self._tx_hash = None
+
     def set_receiver(self,address):
         """
 .. method:: set_receiver(address)
@@ -203,9 +349,33 @@ Transaction class
         """
         if address.startswith("0x"):
             address = address[2:]
-        self.tx[3] = ecc.hex_to_bin(address)
+        self.tx[self._TO] = ecc.hex_to_bin(address)
+        self._changed()
 
     def _set_value(self,value,unit,idx):
+        self._changed()
+        # fast path: values fitting native integers are converted without bignums
+        if type(value)==PSTRING:
+            if value.startswith("0x"):
+                if unit==WEI:
+                    self.tx[idx] = _hex_to_min_bin(value[2:])
+                    return
+                if len(value)<=17:
+                    value = int(value,16)
+            elif len(value)<=18:
+                value = int(value)
+        elif type(value) in (PBYTES,PBYTEARRAY):
+            if unit==WEI:
+                self.tx[idx] = _strip_zeros(value)
+                return
+            if len(value)<=7:
+                value = rlp.to_int(value)
+        if (type(value)==PSMALLINT or type(value)==PINTEGER) and value>=0:
+            mul = _unit_multiplier(unit)
+            if mul and value<=_MAX_INT//mul:
+                self.tx[idx] = rlp.to_binary(value*mul)
+                return
+
         bg = bignum.BigNum(value)
         if unit!=WEI:
             bgt = bignum.BigNum("1"+("0"*unit))
@@ -225,7 +395,7 @@ Transaction class
         Convert *value* to big number format according to *unit* and set the resulting big number as the transaction value.
 
         """
-        self._set_value(value,unit,4)
+        self._set_value(value,unit,self._VALUE)
 
     def set_gas_price(self,value,unit=WEI):
         """
@@ -237,7 +407,7 @@ Transaction class
         Convert *value* to big number format according to *unit* and set the resulting big number as the transaction gas price.
 
         """
-        self._set_value(value,unit,1)
+        self._set_value(value,unit,self._GAS_PRICE)
 
     def set_gas_limit(self,value,unit=WEI):
         """
@@ -249,7 +419,7 @@ Transaction class
         Convert *value* to big number format according to *unit* and set the resulting big number as the transaction gas limit.
 
         """
-        self._set_value(value,unit,2)
+        self._set_value(value,unit,self._GAS_LIMIT)
 
     def set_nonce(self,value):
         """
@@ -260,21 +430,25 @@ Transaction class
         Set transaction nonce.
 
         """
-        self.tx[0] = value
+        self.tx[self._NONCE] = value
+        self._changed()
 
     def set_data(self,value):
         """
 .. method:: set_data(value)
 
-        :param value: binary representation of transaction data. Can be hexadecimal or bytes.
+        :param value: binary representation of transaction data. Can be hexadecimal (starting with 0x), bytes, bytearray or memoryview.
 
-        Set transaction data to *value*
+        Set transaction data to *value*. Binary data is stored as is, hexadecimal data is converted once.
 
         """
         if type(value)==PSTRING and value.startswith("0x"):
-            value = bignum.BigNum(value)
-            value = ecc.hex_to_bin(value.to_base(16))
-        self.tx[5] = value
+            value = value[2:]
+            if len(value)%2:
+                value = "0"+value
+            value = ecc.hex_to_bin(value)
+        self.tx[self._DATA] = value
+        self._changed()
 
     def set_chain(self,chain):
         """
@@ -286,7 +460,30 @@ Transaction class
 
         """
         self.chain = chain
+        self._changed()
+
+    def _encode_payload(self):
+        # EIP-155: chain id, 0, 0 in place of v, r, s
+        return rlp.encode(self.tx[0:6]+[self.chain,b'',b''])
 
+    def _encode_signed(self):
+        return rlp.encode(self.tx)
+
+    def _set_signature(self,v,r,s):
+        self.tx[6] = v+self.chain*2+35
+        self.tx[7] = r
+        self.tx[8] = s
+
+    def signing_payload(self):
+        """
+.. method:: signing_payload()
+
+        Return the RLP representation of the transaction to be hashed for signing (memoized).
+
+        """
+        if self._payload is None:
+            self._payload = self._encode_payload()
+        return self._payload
 
     def to_rlp(self,hex=False):
         """
@@ -296,7 +493,9 @@ Transaction class
 
         Return the `RLP <https://github.com/ethereum/wiki/wiki/RLP>`_ representation of the transaction in biney form. If *hex* is True, the hexadecimal representation is returned.
         """
-        rlpt = rlp.encode(self.tx)
+        if self._rlp is None:
+            self._rlp = self._encode_signed()
+        rlpt = self._rlp
         if hex:
             return ecc.bin_to_hex(rlpt)
         else:
@@ -321,29 +520,17 @@ Transaction class
 
         :param full: boolean
 
-        Return a hash instance (Keccak) of the transaction. To obtain the binary or string hash, call the methods digest/hexdigest on the result.
-        If *full* is False, fields v,r,s of the transaction are set to default values as specified in `EIP-155 <https://github.com/ethereum/EIPs/blob/master/EIPS/eip-155.md>`_.
+        Return a hash instance of the transaction. To obtain the binary or string hash, call the methods digest/hexdigest on the result.
+        If *full* is False, the hash of the signing payload is returned: fields v,r,s of the transaction are set to default values as specified in `EIP-155 <https://github.com/ethereum/EIPs/blob/master/EIPS/eip-155.md>`_.
 
         """
-        if not full:
-            v = self.tx[6]
-            r = self.tx[7]
-            s = self.tx[8]
-            self.tx[6] = self.chain
-            self.tx[7] = b''
-            self.tx[8] = b''
-
-        # print(">>",self.to_rlp(True))
-        rlpt = self.to_rlp()
-        kk = keccak.Keccak()
-        kk.update(rlpt)
-
-        if not full:
-            self.tx[6] = v
-            self.tx[7] = r
-            self.tx[8] = s
-
-        return kk
+        if full:
+            if self._tx_hash is None:
+                self._tx_hash = _Hash(self.to_rlp())
+            return self._tx_hash
+        if self._signing_hash is None:
+            self._signing_hash = _Hash(self.signing_payload())
+        return self._signing_hash
 
     def sign(self,pv):
         """
@@ -355,45 +542,504 @@ Transaction class
 
         """
         #accept hex and bin keys
-        if pv.startswith("0x"):
-            pv = pv[2:]
-            pv = ecc.hex_to_bin(pv)
-
+        pv = _bin_key(pv)
 
         #Check here: replay attacks eip https://github.com/ethereum/EIPs/blob/master/EIPS/eip-155.md
-        self.tx[6] = self.chain
-        self.tx[7] = b''
-        self.tx[8] = b''
-
         dk = self.hash(False).digest()
 
-        v,rs = ecc.sign(ecc.SECP256K1,dk,pv,deterministic=sha2.SHA2(),recoverable=True)
+        v,r,s = _sign_digest(dk,pv)
+        self._set_signature(v,r,s)
+        # the signing payload does not depend on the signature
+        self._rlp = None
+        self._tx_hash = None
+
+    def bump_fees(self,percent):
+        """
+.. method:: bump_fees(percent)
+
+        :param percent: percentage of increase
+
+        Raise the gas price by *percent* percent (at least by one WEI), i.e. to replace a pending transaction with the same nonce.
+        The transaction must be signed again.
+
+        """
+        self._bump(self._GAS_PRICE,percent)
+
+    def _bump(self,idx,percent):
+        price = rlp.to_int(self.tx[idx])
+        bumped = price*(100+percent)//100
+        if bumped<=price:
+            bumped = price+1
+        self._set_value(bumped,WEI,idx)
+
+
+def _access_list(entries):
+    # convert [(address, (storage keys...)), ...] with hex strings to binary RLP items
+    res = []
+    for entry in entries:
+        keys = []
+        for key in entry[1]:
+            keys.append(_hex_bin(key))
+        res.append([_hex_bin(entry[0]),keys])
+    return res
+
+def _hex_bin(value):
+    if type(value)==PSTRING:
+        if value.startswith("0x"):
+            value = value[2:]
+        return ecc.hex_to_bin(value)
+    return value
+
+
+class _TypedTransaction(Transaction):
+    # common implementation of EIP-2718 typed transactions: the fields start with the chain id
+    # and end with access list, y parity, r and s
+
+    __slots__ = ()
+
+    def set_chain(self,chain):
+        self.chain = chain
+        self.tx[0] = chain
+        self._changed()
+
+    def set_access_list(self,entries):
+        """
+.. method:: set_access_list(entries)
+
+        :param entries: a list of tuples :samp:`(address, storage_keys)`, with the address and the 32 bytes storage keys in hex format starting with 0x or bytes
+
+        Set the access list of the transaction, as specified in `EIP-2930 <https://eips.ethereum.org/EIPS/eip-2930>`_.
+
+        """
+        self.tx[-4] = _access_list(entries)
+        self._changed()
+
+    def _encode(self,fields):
+        # type byte followed by the RLP list of fields
+        buf = bytearray(1+rlp.encoded_size(fields))
+        buf[0] = self.TYPE
+        rlp.encode_into(fields,buf,1)
+        return buf
 
-        s = ecc.bin_to_hex(rs[32:])
-        sbg = bignum.BigNum("0x"+s)
-        bg2 = bignum.BigNum(2)
-        s2bg = sbg.mul(bg2)
-        Nbg = bignum.BigNum(N)
+    def _encode_payload(self):
+        return self._encode(self.tx[:-3])
 
-        #Check here: https://github.com/ethereum/py_ecc/blob/master/py_ecc/secp256k1/secp256k1.py#L109
-        if s2bg.gte(Nbg):
-            sn = Nbg.sub(sbg)
-            s = sn.to_base(16)
-            s = ecc.hex_to_bin(s)
-            v = v^1
+    def _encode_signed(self):
+        return self._encode(self.tx)
+
+    def _set_signature(self,v,r,s):
+        self.tx[-3] = v
+        self.tx[-2] = r
+        self.tx[-1] = s
+
+    def __str__(self):
+        res = ""
+        res+= "Type:      "+str(self.TYPE)+"\n"
+        res+= "Chain:     "+str(self.chain)+"\n"
+        res+= "Nonce:     "+str(self.tx[self._NONCE])+"\n"
+        if self.TYPE==DYNAMIC_FEE_TX:
+            res+= "Priority:  "+ecc.bin_to_hex(self.tx[self._PRIORITY_FEE])+"\n"
+            res+= "Max Fee:   "+ecc.bin_to_hex(self.tx[self._GAS_PRICE])+"\n"
         else:
-            s = rs[32:]
+            res+= "Gas Price: "+ecc.bin_to_hex(self.tx[self._GAS_PRICE])+"\n"
+        res+= "Gas Limit: "+ecc.bin_to_hex(self.tx[self._GAS_LIMIT])+"\n"
+        res+= "Address:   "+ecc.bin_to_hex(self.tx[self._TO])+"\n"
+        res+= "Value:     "+ecc.bin_to_hex(self.tx[self._VALUE])+"\n"
+        res+= "Data:      "+ecc.bin_to_hex(self.tx[self._DATA])+"\n"
+        res+= "Access:    "+str(len(self.tx[-4]))+" entries\n"
+        res+= "Y Parity:  "+str(self.tx[-3])+"\n"
+        res+= "R:         "+ecc.bin_to_hex(self.tx[-2])+"\n"
+        res+= "S:         "+ecc.bin_to_hex(self.tx[-1])
+        return res
 
 
-        self.tx[6] = v+self.chain*2+35
-        self.tx[7] = rs[0:32]
-        self.tx[8] = s
+class AccessListTransaction(_TypedTransaction):
+    """
+===========================
+AccessListTransaction class
+===========================
+
+.. class:: AccessListTransaction(chain=MAIN)
+
+    Creates an instance of a `EIP-2930 <https://eips.ethereum.org/EIPS/eip-2930>`_ transaction (type 1) on the network id specified by *chain*.
+
+    It has the same methods of :class:`Transaction` plus :samp:`set_access_list`. The RLP representation is prefixed by the transaction type
+    and the signature uses the y parity instead of the EIP-155 *v*.
+    """
+    __slots__ = ()
+    TYPE = ACCESS_LIST_TX
+
+    _NONCE     = 1
+    _GAS_PRICE = 2
+    _GAS_LIMIT = 3
+    _TO        = 4
+    _VALUE     = 5
+    _DATA      = 6
+
+    def __init__(self,chain=MAIN):
+        self.tx = [b'',b'',b'',b'',b'',b'',b'',[],b'',b'',b'']
+        self.set_chain(chain)
+
+
+class DynamicFeeTransaction(_TypedTransaction):
+    """
+===========================
+DynamicFeeTransaction class
+===========================
+
+.. class:: DynamicFeeTransaction(chain=MAIN)
+
+    Creates an instance of a `EIP-1559 <https://eips.ethereum.org/EIPS/eip-1559>`_ transaction (type 2) on the network id specified by *chain*.
+
+    Instead of a gas price, the transaction specifies the maximum fee per gas it is willing to pay (:meth:`set_max_fee`) and the
+    priority fee (tip) for the miner (:meth:`set_max_priority_fee`): the actual price paid is the base fee of the block plus the priority fee,
+    never exceeding the maximum fee. Suitable values can be obtained with :func:`estimate_fees`. ::
+
+        max_fee, priority_fee = ethereum.estimate_fees(eth)
+        tx = ethereum.DynamicFeeTransaction(ethereum.ROPSTEN)
+        tx.set_max_fee(max_fee)
+        tx.set_max_priority_fee(priority_fee)
+        tx.set_gas_limit(21000)
+        tx.set_nonce(nonce)
+        tx.set_receiver(address)
+        tx.set_value(1, ethereum.FINNEY)
+        tx.sign(config.PRIVATE_KEY)
+        eth.sendTransaction(tx.to_rlp())
+
+    It has the same methods of :class:`Transaction` plus :samp:`set_access_list`; :samp:`set_gas_price` sets the maximum fee.
+    """
+    __slots__ = ()
+    TYPE = DYNAMIC_FEE_TX
+
+    _NONCE        = 1
+    _PRIORITY_FEE = 2
+    _GAS_PRICE    = 3
+    _GAS_LIMIT    = 4
+    _TO           = 5
+    _VALUE        = 6
+    _DATA         = 7
+
+    def __init__(self,chain=MAIN):
+        self.tx = [b'',b'',b'',b'',b'',b'',b'',b'',[],b'',b'',b'']
+        self.set_chain(chain)
+
+    def set_max_fee(self,value,unit=WEI):
+        """
+.. method:: set_max_fee(value, unit=WEI)
+
+        :param value: maximum fee per gas as an hexadecimal string, bytes or integer
+        :param unit: a unit constant, default WEI
+
+        Set the maximum total fee per gas (base fee plus priority fee).
+
+        """
+        self._set_value(value,unit,self._GAS_PRICE)
+
+    def set_max_priority_fee(self,value,unit=WEI):
+        """
+.. method:: set_max_priority_fee(value, unit=WEI)
+
+        :param value: maximum priority fee per gas as an hexadecimal string, bytes or integer
+        :param unit: a unit constant, default WEI
+
+        Set the maximum priority fee per gas paid to the miner.
+
+        """
+        self._set_value(value,unit,self._PRIORITY_FEE)
+
+    def bump_fees(self,percent):
+        self._bump(self._GAS_PRICE,percent)
+        self._bump(self._PRIORITY_FEE,percent)
+
+
+def estimate_fees(rpc,blocks=10,percentile=50,headroom=2):
+    """
+.. function:: estimate_fees(rpc,blocks=10,percentile=50,headroom=2)
+
+    :param rpc: a :ref:`RPC <lib.blockchain.ethereum.rpc>` instance
+    :param blocks: number of recent blocks to consider
+    :param percentile: percentile of the priority fees paid in each block
+    :param headroom: multiplier of the next base fee, to keep the transaction valid if the base fee rises in the next blocks
+
+    Estimate the fees for a :class:`DynamicFeeTransaction` from :samp:`eth_feeHistory`. The priority fee is the median, across the last *blocks* blocks,
+    of the *percentile* percentile of the priority fees; the maximum fee is the base fee of the next block times *headroom* plus the priority fee.
+    Return a tuple :samp:`(max_fee, max_priority_fee)` in WEI, or None on error.
+
+    """
+    res = rpc.getFeeHistory(blocks,"latest",[percentile])
+    if res is None:
+        return None
+    rewards = []
+    for r in res.get("reward",()):
+        v = int(r[0],16)
+        j = len(rewards)
+        while j>0 and rewards[j-1]>v:
+            j-=1
+        rewards.insert(j,v)
+    priority = rewards[len(rewards)//2] if rewards else 0
+    base = int(res["baseFeePerGas"][-1],16)
+    return base*headroom+priority, priority
+
+
+def _selector(sig):
+    kk = keccak.Keccak()
+    kk.update(sig)
+    return kk.digest()[:4]
+
+
+def _topic(sig):
+    kk = keccak.Keccak()
+    kk.update(sig)
+    return kk.digest()
+
+
+def _only(idx, n):
+    sel = []
+    for i in range(n):
+        sel.append(i == idx)
+    return sel
+
+
+# node errors asking to reduce the block range of eth_getLogs (not rate limits, that must not shrink the range)
+_TOO_MANY_ERRORS = (
+    "returned more than",
+    "too many results",
+    "response size exceeded",
+    "block range",
+    "range too large",
+    "range is too large"
+)
+
+def _too_many(error):
+    if type(error) != PSTRING:
+        return False
+    error = error.lower()
+    for msg in _TOO_MANY_ERRORS:
+        if msg in error:
+            return True
+    return False
 
-        # R and S must not start with 0 for RLP
-        while self.tx[7][0]==0:
-            self.tx[7]=self.tx[7][1:]
-        while self.tx[8][0]==0:
-            self.tx[8]=self.tx[8][1:]
+
+# secp256k1 N and (N-1)/2 as 32 bytes big endian, for the low s normalization
+_N_BIN = ecc.hex_to_bin("fffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141")
+_HALF_N_BIN = ecc.hex_to_bin("7fffffffffffffffffffffffffffffff5d576e7357a4501ddfe92f46681b20a0")
+
+def _high_s(s):
+    # True if the 32 bytes s is greater than (N-1)/2, i.e. 2*s >= N
+    for i in range(32):
+        if s[i]!=_HALF_N_BIN[i]:
+            return s[i]>_HALF_N_BIN[i]
+    return False
+
+def _n_minus(s):
+    # N - s on 32 bytes big endian numbers
+    res = bytearray(32)
+    borrow = 0
+    i = 31
+    while i>=0:
+        d = _N_BIN[i]-s[i]-borrow
+        if d<0:
+            d+=256
+            borrow = 1
+        else:
+            borrow = 0
+        res[i] = d
+        i-=1
+    return res
+
+def _sign_digest(dk,pv):
+    # sign digest dk with binary key pv, return recovery id, r and s (low s, no leading zeros)
+    v,rs = ecc.sign(ecc.SECP256K1,dk,pv,deterministic=sha2.SHA2(),recoverable=True)
+
+    #Check here: https://github.com/ethereum/py_ecc/blob/master/py_ecc/secp256k1/secp256k1.py#L109
+    s = rs[32:]
+    if _high_s(s):
+        s = _n_minus(s)
+        v = v^1
+
+    # R and S must not start with 0 for RLP
+    return v,_strip_zeros(rs[0:32]),_strip_zeros(s)
+
+def _bin_key(pv):
+    # private key in binary format
+    if type(pv)==PSTRING and pv.startswith("0x"):
+        return ecc.hex_to_bin(pv[2:])
+    return pv
+
+
+class Signer():
+    """
+============
+Signer class
+============
+
+.. class:: Signer(pv)
+
+    :param pv: private key in hexadecimal or binary format
+
+    Create a signer for the private key *pv*. The key is converted to binary once, so that signing many transactions
+    only costs the hashing and the ECDSA signature of each. ::
+
+        signer = ethereum.Signer(config.PRIVATE_KEY)
+        for raw in signer.sign_many(transactions):
+            eth.sendTransaction(raw)
+
+    """
+    def __init__(self,pv):
+        self.key = _bin_key(pv)
+        self._address = None
+
+    def address(self):
+        """
+.. method:: address()
+
+        Return the Ethereum address of the signer (computed on first use).
+
+        """
+        if self._address is None:
+            self._address = get_address(self.key)
+        return self._address
+
+    def sign_digest(self,dk):
+        """
+.. method:: sign_digest(dk)
+
+        :param dk: 32 bytes digest
+
+        Sign *dk* and return a tuple :samp:`(v, r, s)` with the recovery id, and the low s signature as bytes without leading zeros.
+
+        """
+        return _sign_digest(dk,self.key)
+
+    def sign(self,tx):
+        """
+.. method:: sign(tx)
+
+        :param tx: a :class:`Transaction` (or a typed transaction)
+
+        Sign *tx* and return it.
+
+        """
+        tx.sign(self.key)
+        return tx
+
+    def sign_many(self,transactions,hex=False):
+        """
+.. method:: sign_many(transactions,hex=False)
+
+        :param transactions: an iterable of transactions
+        :param hex: boolean
+
+        Return a generator signing the transactions one at a time and yielding their RLP representation, in binary form or in hexadecimal form if *hex* is True.
+        Transactions can be sent as soon as they are yielded, without waiting for the whole batch to be signed.
+
+        """
+        for tx in transactions:
+            tx.sign(self.key)
+            yield tx.to_rlp(hex)
+
+
+def _encode_around(head,body,tail):
+    # RLP encode the list of items head + tail, with the already encoded items body spliced in between
+    l = len(body)
+    for item in head:
+        l+=rlp.encoded_size(item)
+    for item in tail:
+        l+=rlp.encoded_size(item)
+    pre = rlp.encode_length(l,192)
+    buf = bytearray(len(pre)+l)
+    buf[0:len(pre)] = pre
+    ofs = len(pre)
+    for item in head:
+        ofs = rlp.encode_into(item,buf,ofs)
+    buf[ofs:ofs+len(body)] = body
+    ofs+=len(body)
+    for item in tail:
+        ofs = rlp.encode_into(item,buf,ofs)
+    return buf
+
+
+class TransactionTemplate():
+    """
+==========================
+TransactionTemplate class
+==========================
+
+.. class:: TransactionTemplate(tx)
+
+    Create a template from the :class:`Transaction` *tx* (legacy or typed), to quickly generate many transactions differing only by nonce.
+
+    Fees, gas limit, receiver, value, data (and access list) of *tx* are RLP encoded once; signing a transaction for a new nonce
+    only encodes the nonce and the signature fields around them. ::
+
+        tx = ethereum.Transaction(ethereum.ROPSTEN)
+        tx.set_gas_price("0x430e23411")
+        tx.set_gas_limit("0x33450")
+        tx.set_receiver(config.CONTRACT_ADDRESS)
+        tx.set_data(calldata)
+        tpl = ethereum.TransactionTemplate(tx)
+
+        for nonce in range(nt, nt+10):
+            eth.sendTransaction(tpl.sign(nonce, config.PRIVATE_KEY))
+
+    """
+    def __init__(self,tx):
+        self.chain = tx.chain
+        self._type = getattr(tx,"TYPE",None)
+        # fields after the nonce and before the signature
+        body = tx.tx[tx._NONCE+1:-3] if self._type else tx.tx[1:6]
+        l = 0
+        for item in body:
+            l+=rlp.encoded_size(item)
+        self._body = bytearray(l)
+        ofs = 0
+        for item in body:
+            ofs = rlp.encode_into(item,self._body,ofs)
+
+    def _encode(self,nonce,sig):
+        if not self._type:
+            return _encode_around((nonce,),self._body,sig)
+        rlpt = _encode_around((self.chain,nonce),self._body,sig)
+        buf = bytearray(1+len(rlpt))
+        buf[0] = self._type
+        buf[1:] = rlpt
+        return buf
+
+    def signing_payload(self,nonce):
+        """
+.. method:: signing_payload(nonce)
+
+        :param nonce: transaction nonce as integer
+
+        Return the RLP representation of the transaction with nonce *nonce* to be hashed for signing, as specified in `EIP-155 <https://github.com/ethereum/EIPs/blob/master/EIPS/eip-155.md>`_
+        (or in `EIP-2718 <https://eips.ethereum.org/EIPS/eip-2718>`_ for typed transactions).
+
+        """
+        if self._type:
+            return self._encode(nonce,())
+        return self._encode(nonce,(self.chain,b'',b''))
+
+    def sign(self,nonce,pv,hex=False):
+        """
+.. method:: sign(nonce,pv,hex=False)
+
+        :param nonce: transaction nonce as integer
+        :param pv: private key in hexadecimal or binary format
+        :param hex: boolean
+
+        Sign the transaction with nonce *nonce* and return its RLP representation in binary form, or in hexadecimal form if *hex* is True.
+
+        """
+        pv = _bin_key(pv)
+        kk = keccak.Keccak()
+        kk.update(self.signing_payload(nonce))
+        v,r,s = _sign_digest(kk.digest(),pv)
+        if not self._type:
+            v+=self.chain*2+35
+        rlpt = self._encode(nonce,(v,r,s))
+        if hex:
+            return ecc.bin_to_hex(rlpt)
+        return rlpt
 
 
 class Contract():
@@ -423,53 +1069,277 @@ Contract class
         self._rpc = rpc
         self._address = contract_address
         self._functions = {}
-        self._key = key
+        self._events = {}
+        self._topics = {}
+        self._key = _bin_key(key)
         self._chain = chain
 
         self._from = address
 
-    def register_function(self, function, gas_price=None, gas_limit=None, args_type=()):
+    def register_function(self, function, gas_price=None, gas_limit=None, args_type=(), returns=None):
         """
-.. method:: register_function(function, gas_price=None, gas_limit=None, args_type=())
+.. method:: register_function(function, gas_price=None, gas_limit=None, args_type=(), returns=None)
 
         :param function: function name
         :param gas_price: gas price for function execution, can be None, an tuple (value, unit) or a single integer value which will be considered in WEI unit
         :param gas_limit: gas limit for function execution, can be None, an tuple (value, unit) or a single integer value which will be considered in WEI unit
-        :param args_type: a tuple specifying function arguments' type following `Ethereum ABI <https://github.com/ethereum/wiki/wiki/Ethereum-Contract-ABI>`_, at the moment only a subset of possible types is supported: :code:`address`, :code:`uint<M>` where :code:`0 < M < 256 and M % 8 == 0`
+        :param args_type: a tuple specifying function arguments' type following `Ethereum ABI <https://github.com/ethereum/wiki/wiki/Ethereum-Contract-ABI>`_: :code:`address`, :code:`bool`, :code:`uint<M>` and :code:`int<M>` where :code:`0 < M <= 256 and M % 8 == 0`, :code:`bytes<M>` where :code:`0 < M <= 32`, :code:`bytes`, :code:`string`, arrays :code:`T[]`, :code:`T[k]` and tuples :code:`(T1,T2,...)`
+
+        :param returns: an optional tuple specifying the types of the function return values, supporting the same types of *args_type*
 
         Register a contract function to be called.
 
+        Argument and return types are compiled once into an encoding plan (see the :ref:`abi <lib.blockchain.ethereum.abi>` module): every call then encodes
+        its arguments directly into binary calldata and, if *returns* is given, :meth:`call` decodes the result into native values.
+
         """
-        args = []
-        fsign = function + '('
+        plan = abi.compile(args_type)
+        mth = _selector(abi.signature(function,args_type))
 
-        if len(args_type) == 0:
-            fsign += ')'
-        else:
-            for i, arg_type in enumerate(args_type):
-                # if arg_type not in _supported_types:
-                if not supported_type(arg_type):
-                    raise UnsupportedError
-                args.append(arg_type)
-                cc = (')' if i == len(args_type)-1 else ',')
-                fsign += (arg_type + cc)
+        rplan = None
+        if returns is not None:
+            rplan = abi.compile(returns)
 
-        kk = keccak.Keccak()
-        kk.update(fsign)
-        mth = '0x' + (kk.hexdigest()[:8]).lower()
+        self._functions[function] = (mth, gas_price, gas_limit, plan, rplan)
 
-        self._functions[function] = (mth, gas_price, gas_limit, args)
+    def register_compiled(self, function, selector, plan, rplan=None, gas_price=None, gas_limit=None):
+        """
+.. method:: register_compiled(function, selector, plan, rplan=None, gas_price=None, gas_limit=None)
 
-    def _build_transaction(self, function, nonce, value, args):
-        fparam = self._functions[function]
-        data = fparam[0]
+        :param function: function name
+        :param selector: the 4 bytes function selector
+        :param plan: the arguments encoding plan, as returned by :samp:`abi.compile`
+        :param rplan: the optional return values decoding plan, as returned by :samp:`abi.compile`
+
+        Register a contract function whose selector and plans have been precomputed (see :meth:`from_table`).
+        Other parameters are the same of :meth:`register_function`.
+
+        """
+        self._functions[function] = (selector, gas_price, gas_limit, plan, rplan)
+
+    @staticmethod
+    def from_abi(rpc, contract_address, abi_json, key=None, address=None, chain=MAIN, gas_price=None, gas_limit=None):
+        """
+.. method:: from_abi(rpc, contract_address, abi_json, key=None, address=None, chain=MAIN, gas_price=None, gas_limit=None)
+
+        :param abi_json: the contract ABI as generated by solc, as a JSON string or an already parsed list
+
+        Return a new :class:`Contract` with all the functions of *abi_json* registered with *gas_price* and *gas_limit*, and all its non anonymous events.
+        Overloaded functions and events are registered by name for the first occurrence and by full signature (i.e. :samp:`transfer(address,uint256)`) for the following ones.
+
+        Other parameters are the same of :class:`Contract`.
+        Parsing and hashing are performed on the device: use :meth:`from_table` to skip them.
+
+        """
+        if type(abi_json) == PSTRING:
+            abi_json = json.loads(abi_json)
+        contract = Contract(rpc, contract_address, key, address, chain)
+        for entry in abi_json:
+            kind = entry.get("type", "function")
+            if kind == "event" and not entry.get("anonymous", False):
+                args_type = tuple([abi.param_type(p) for p in entry["inputs"]])
+                indexed = tuple([p.get("indexed", False) for p in entry["inputs"]])
+                name = entry["name"]
+                if name in contract._topics:
+                    name = abi.signature(name, args_type)
+                contract.register_compiled_event(name, _topic(abi.signature(entry["name"], args_type)), abi.compile(args_type), indexed)
+                continue
+            if kind != "function":
+                continue
+            name = entry["name"]
+            args_type = tuple([abi.param_type(p) for p in entry.get("inputs", ())])
+            outputs = entry.get("outputs", ())
+            # functions without outputs return the raw result, as with register_function without returns
+            rplan = None
+            if outputs:
+                rplan = abi.compile(tuple([abi.param_type(p) for p in outputs]))
+            sig = abi.signature(name, args_type)
+            if name in contract._functions:
+                name = sig
+            contract.register_compiled(name, _selector(sig), abi.compile(args_type), rplan, gas_price, gas_limit)
+        return contract
+
+    @staticmethod
+    def from_table(rpc, contract_address, table, key=None, address=None, chain=MAIN, gas_price=None, gas_limit=None):
+        """
+.. method:: from_table(rpc, contract_address, table, key=None, address=None, chain=MAIN, gas_price=None, gas_limit=None)
+
+        :param table: a module generated from the contract ABI by the :file:`tools/abigen.py` script
+
+        Return a new :class:`Contract` with all the functions of *table* registered with *gas_price* and *gas_limit*, and all its non anonymous events.
+        Selectors and encoding plans are precomputed in *table*, so no JSON parsing nor hashing is performed on the device. ::
+
+            # on the host: python3 tools/abigen.py Game.abi game_abi.py
+            import game_abi
+
+            game = ethereum.Contract.from_table(eth, config.CONTRACT_ADDRESS, game_abi, config.PRIVATE_KEY, config.ADDRESS, ethereum.ROPSTEN, config.GAS_PRICE, "0x6691b7")
+
+        Other parameters are the same of :class:`Contract`.
+
+        """
+        contract = Contract(rpc, contract_address, key, address, chain)
+        for name in table.FUNCTIONS:
+            fn = table.FUNCTIONS[name]
+            contract.register_compiled(name, fn[0], fn[1], fn[2], gas_price, gas_limit)
+        for name in table.EVENTS:
+            ev = table.EVENTS[name]
+            if not ev[3]:
+                contract.register_compiled_event(name, ev[0], ev[1], ev[2])
+        return contract
+
+    def register_event(self, event, args_type=(), indexed=(), handler=None):
+        """
+.. method:: register_event(event, args_type=(), indexed=(), handler=None)
+
+        :param event: event name
+        :param args_type: a tuple specifying the types of the event parameters, supporting the same types of :meth:`register_function`
+        :param indexed: a tuple of booleans, True for each indexed parameter; if shorter than *args_type*, missing parameters are not indexed
+        :param handler: an optional function called as :samp:`handler(values, log)` for each log of the event found by :meth:`get_logs`
+
+        Register a contract event (non anonymous) to be decoded from logs. The event topic hash is computed once and used as
+        key to dispatch logs to their event.
+
+        """
+        flags = []
+        for i in range(len(args_type)):
+            flags.append(i < len(indexed) and indexed[i])
+        self.register_compiled_event(event, _topic(abi.signature(event, args_type)), abi.compile(args_type), tuple(flags), handler)
+
+    def register_compiled_event(self, event, topic, plan, indexed, handler=None):
+        """
+.. method:: register_compiled_event(event, topic, plan, indexed, handler=None)
 
-        for i, arg in enumerate(args):
-            if type(arg)==PSTRING and arg.startswith("0x"):
-                data += _pad32(arg)
+        :param topic: the 32 bytes Keccak hash of the event signature
+        :param plan: the parameters plan, as returned by :samp:`abi.compile`
+        :param indexed: a tuple of booleans, True for each indexed parameter
+
+        Register a contract event whose topic and plan have been precomputed (see :meth:`from_table`).
+        Other parameters are the same of :meth:`register_event`.
+
+        """
+        data = []
+        topics = []
+        for i in range(len(indexed)):
+            data.append(not indexed[i])
+            # indexed values of non elementary type (strings, bytes, arrays, tuples) are stored as their hash
+            if indexed[i] and abi.is_elementary(plan, i):
+                topics.append(abi.subplan(plan, _only(i, len(indexed))))
             else:
-                registered_type = fparam[3][i]
-                data += _pad32(convert(registered_type, arg))
+                topics.append(None)
+        key = '0x' + ecc.bin_to_hex(topic).lower()
+        self._events[key] = [event, indexed, abi.subplan(plan, data), topics, handler]
+        self._topics[event] = key
+
+    def set_handler(self, event, handler):
+        """
+.. method:: set_handler(event, handler)
+
+        Set the function called as :samp:`handler(values, log)` for each log of the registered event *event*.
+
+        """
+        self._events[self._topics[event]][4] = handler
+
+    def decode_log(self, log):
+        """
+.. method:: decode_log(log)
+
+        :param log: a log object as returned by the node (i.e. an element of the result of :samp:`eth_getLogs`)
+
+        Return a tuple :samp:`(event, values)` with the name of the event and the tuple of its decoded parameters,
+        or None if *log* is not a registered event. Indexed parameters of non elementary type (strings, bytes, arrays and tuples) are returned as their 32 bytes hash.
+
+        """
+        topics = log["topics"]
+        if not len(topics):
+            return None
+        ev = self._events.get(topics[0].lower())
+        if ev is None:
+            return None
+        indexed = ev[1]
+        data = log["data"]
+        vals = abi.decode(ev[2], ecc.hex_to_bin(data[2:])) if len(data) > 2 else ()
+        res = []
+        t = 1
+        d = 0
+        for i in range(len(indexed)):
+            if indexed[i]:
+                word = ecc.hex_to_bin(topics[t][2:])
+                t += 1
+                if ev[3][i] is None:
+                    res.append(word)
+                else:
+                    res.append(abi.decode(ev[3][i], word)[0])
+            else:
+                res.append(vals[d])
+                d += 1
+        return ev[0], tuple(res)
+
+    def get_logs(self, from_block, to_block="latest", page=1000):
+        """
+.. method:: get_logs(from_block, to_block="latest", page=1000)
+
+        :param from_block: first block to search, as integer
+        :param to_block: last block to search, as integer or :samp:`"latest"`
+        :param page: maximum number of blocks requested with a single :samp:`eth_getLogs` call
+
+        Retrieve the logs of all registered events emitted by the contract between *from_block* and *to_block*.
+        The block range is split into pages of *page* blocks; if the node refuses a page because of too many results, the page is halved.
+
+        Each log is dispatched to its event by topic hash: logs of events with a handler are passed to it, the others are returned
+        as a list of tuples :samp:`(event, values, log)`. Return None on error, the reason can be retrieved in the :samp:`last_error` of the RPC instance.
+
+        """
+        if to_block == "latest":
+            to_block = self._rpc.getBlockNumber()
+            if to_block < 0:
+                return None
+        topics = [[key for key in self._events]]
+        res = []
+        start = from_block
+        while start <= to_block:
+            end = start + page - 1
+            if end > to_block:
+                end = to_block
+            # the error is taken from the call itself: last_error can be overwritten by other threads
+            logs, error = self._rpc.request("eth_getLogs", [{
+                "address": self._address,
+                "fromBlock": hex(start),
+                "toBlock": hex(end),
+                "topics": topics
+            }])
+            if logs is None:
+                if page > 1 and _too_many(error):
+                    page = page // 2
+                    continue
+                self._rpc.last_error = error
+                return None
+            for log in logs:
+                ev = self.decode_log(log)
+                if ev is None:
+                    continue
+                handler = self._events[log["topics"][0].lower()][4]
+                if handler is not None:
+                    handler(ev[1], log)
+                else:
+                    res.append((ev[0], ev[1], log))
+            start = end + 1
+        return res
+
+    def _calldata(self, function, args):
+        # binary calldata: selector followed by the encoded arguments
+        fparam = self._functions[function]
+        return abi.encode(fparam[3], args, fparam[0])
+
+    def _decode_result(self, function, data):
+        # decode the binary result of a call to function according to its registered return types
+        vals = abi.decode(self._functions[function][4], data)
+        if len(vals) == 1:
+            return vals[0]
+        return vals
+
+    def _build_transaction(self, function, nonce, value, args):
+        fparam = self._functions[function]
+        data = self._calldata(function, args)
 
         # full transaction or call "transaction"
         if nonce is not None:
@@ -499,12 +1369,13 @@ Contract class
             tx.set_data(data)
             tx.sign(self._key)
 
-            tx = tx.to_rlp(True)
+            # binary RLP, converted to hex only when sent
+            tx = tx.to_rlp()
         else:
             tx = {}
             tx['to'] = self._address
             tx['from'] = self._from
-            tx['data'] = data
+            tx['data'] = '0x' + ecc.bin_to_hex(data)
 
         return tx
 
@@ -532,16 +1403,26 @@ Contract class
 
         Call a previously registered function not modifying the blockchain.
 
+        If the function has been registered with *returns* and *rv* is not given, the result is decoded according to the registered types:
+        a single value is returned as is, more values as a tuple. None is returned on error or if the call returns no data
+        (i.e. there is no contract at the address or the call reverted); :samp:`ValueError` is raised if the result is malformed.
+
         """
         res = self._rpc.simpleCall(self._build_transaction(function, None, None, args))
         if rv is None:
-            return res
-
+            rplan = self._functions[function][4]
+            if rplan is None or res is None:
+                return res
+            if len(res) <= 2:
+                # "0x": no code at the contract address or reverted call
+                return None
+            return self._decode_result(function, ecc.hex_to_bin(res[2:]))
+
+        if res is None or len(res) <= 2:
+            return None
         toconv = res[-(rv[0]//8)*2:]
         if rv[1] == str:
             return '0x' + toconv
         if rv[1] == int:
             return int(toconv, 16)
         raise UnsupportedError
-
-
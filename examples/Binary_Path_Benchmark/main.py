@@ -0,0 +1,121 @@
+import streams
+import timers
+
+# Ethereum modules
+from blockchain.ethereum import ethereum
+from crypto.ecc import ecc
+from bignum import bignum
+
+
+# Use serial monitor
+streams.serial()
+
+ROUNDS = 50
+
+# a throwaway key: transactions are only signed, never sent
+PRIVATE_KEY = "0x4646464646464646464646464646464646464646464646464646464646464646"
+RECEIVER = "0x3535353535353535353535353535353535353535"
+# transfer(address,uint256) call data
+DATA = "0xa9059cbb0000000000000000000000003535353535353535353535353535353535353535000000000000000000000000000000000000000000000000000000000000002a"
+
+
+class Plain():
+    # conversions as done by the library
+    def hex_to_bin(self, x):
+        return ecc.hex_to_bin(x)
+
+    def bin_to_hex(self, x):
+        return ecc.bin_to_hex(x)
+
+    def bignum(self, x):
+        return bignum.BigNum(x)
+
+    def to_base(self, bg):
+        return bg.to_base(16)
+
+    def concat(self, a, b):
+        return a+b
+
+
+class Counted(Plain):
+    # same conversions, counting the objects they build
+    def __init__(self):
+        self.counts = {"hex_to_bin": 0, "bin_to_hex": 0, "bignum": 0, "to_base": 0, "concat": 0}
+
+    def hex_to_bin(self, x):
+        self.counts["hex_to_bin"] += 1
+        return ecc.hex_to_bin(x)
+
+    def bin_to_hex(self, x):
+        self.counts["bin_to_hex"] += 1
+        return ecc.bin_to_hex(x)
+
+    def bignum(self, x):
+        self.counts["bignum"] += 1
+        return bignum.BigNum(x)
+
+    def to_base(self, bg):
+        self.counts["to_base"] += 1
+        return bg.to_base(16)
+
+    def concat(self, a, b):
+        self.counts["concat"] += 1
+        return a+b
+
+
+def new_tx():
+    tx = ethereum.Transaction(ethereum.ROPSTEN)
+    tx.set_nonce(7)
+    tx.set_gas_price(20, ethereum.GWEI)
+    tx.set_gas_limit(60000)
+    tx.set_receiver(RECEIVER)
+    return tx
+
+
+def before(tx, conv):
+    # the data path before binary transactions: set_data through a BigNum, hex RLP, 0x prefix added when sending
+    tx.tx[tx._DATA] = conv.hex_to_bin(conv.to_base(conv.bignum(DATA)))
+    tx._changed()
+    tx.sign(PRIVATE_KEY)
+    return conv.concat("0x", conv.bin_to_hex(tx.to_rlp()))
+
+
+def after(tx, conv):
+    # the current data path: hex data decoded once, binary RLP, hex produced at the JSON boundary
+    tx.tx[tx._DATA] = conv.hex_to_bin(DATA[2:])
+    tx._changed()
+    tx.sign(PRIVATE_KEY)
+    return conv.concat("0x", conv.bin_to_hex(tx.to_rlp()))
+
+
+def library(tx):
+    # the current data path through the library calls
+    tx.set_data(DATA)
+    tx.sign(PRIVATE_KEY)
+    return "0x"+ecc.bin_to_hex(tx.to_rlp())
+
+
+def bench(fn, conv):
+    start = timers.now()
+    for i in range(ROUNDS):
+        if conv is None:
+            fn(new_tx())
+        else:
+            fn(new_tx(), conv)
+    return timers.now()-start
+
+
+print("Binary path benchmark")
+for name, fn in (("before", before), ("after", after)):
+    conv = Counted()
+    fn(new_tx(), conv)
+    print(name, "conversions per transaction:", conv.counts)
+
+# the mirrored path must build exactly what the library sends
+print("after matches the library:", after(new_tx(), Plain()) == library(new_tx()))
+
+print(ROUNDS, "transactions (ms)")
+print("before:", bench(before, Plain()), "after:", bench(after, Plain()), "library:", bench(library, None))
+
+while True:
+    sleep(10000)
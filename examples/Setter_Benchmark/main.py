@@ -0,0 +1,53 @@
+import streams
+import timers
+
+# Ethereum modules
+from blockchain.ethereum import ethereum
+from crypto.ecc import ecc
+from bignum import bignum
+
+
+# Use serial monitor
+streams.serial()
+
+ROUNDS = 200
+
+# (value, unit) pairs as passed to the Transaction setters
+CASES = [
+    ("int WEI", 21000, ethereum.WEI),
+    ("int GWEI", 20, ethereum.GWEI),
+    ("int ETHER", 1, ethereum.ETHER),
+    ("hex WEI", "0x430e23411", ethereum.WEI),
+    ("dec GWEI", "35", ethereum.GWEI),
+]
+
+
+def bignum_setter(tx, value, unit):
+    # the conversion used by the setters before the native integer fast path
+    bg = bignum.BigNum(value)
+    if unit != ethereum.WEI:
+        bgt = bignum.BigNum("1"+("0"*unit))
+        bg.imul(bgt)
+    tx.tx[1] = ecc.hex_to_bin(bg.to_base(16))
+
+
+def bench(fn, tx, value, unit):
+    start = timers.now()
+    for i in range(ROUNDS):
+        fn(tx, value, unit)
+    return timers.now()-start
+
+
+def fast_setter(tx, value, unit):
+    tx.set_gas_price(value, unit)
+
+
+tx = ethereum.Transaction()
+print("Setter benchmark,", ROUNDS, "rounds per case (ms)")
+for name, value, unit in CASES:
+    before = bench(bignum_setter, tx, value, unit)
+    after = bench(fast_setter, tx, value, unit)
+    print(name, "bignum:", before, "fast path:", after)
+
+while True:
+    sleep(10000)
@@ -0,0 +1,209 @@
+"""
+.. module:: multicall
+
+*********
+Multicall
+*********
+
+This module groups many read-only calls of registered :samp:`Contract` functions, possibly of different contracts,
+so that they are executed with a single network round trip.
+
+If a Multicall aggregator contract (exposing :samp:`aggregate((address,bytes)[])`, as the widely deployed Multicall contract) is
+available on the network, all the calls are packed in a single :samp:`eth_call` to the aggregator. Otherwise they are sent as
+a single JSON-RPC batch of :samp:`eth_call` requests. In both cases every result is decoded according to the return types
+registered for its function. ::
+
+    from blockchain.ethereum import rpc
+    from blockchain.ethereum import ethereum
+    from blockchain.ethereum import multicall
+
+    ...
+
+    eth = rpc.RPC(config.RPC_URL, keep_alive=True)
+    game = ethereum.Contract(eth, config.GAME_ADDRESS)
+    game.register_function("getJackpot", returns=("uint256",))
+    token = ethereum.Contract(eth, config.TOKEN_ADDRESS)
+    token.register_function("balanceOf", args_type=("address",), returns=("uint256",))
+
+    mc = multicall.Multicall(eth, config.MULTICALL_ADDRESS)
+    jackpot = mc.add(game, "getJackpot")
+    balance = mc.add(token, "balanceOf", (config.ADDRESS,))
+
+    # calls are encoded once and can be executed again on every refresh
+    while True:
+        if mc.call():
+            print(mc.result(jackpot), mc.result(balance))
+        sleep(10000)
+
+
+    """
+
+from crypto.ecc import ecc as ecc
+from blockchain.ethereum import abi
+
+# aggregate((address,bytes)[]) returns (uint256 blockNumber, bytes[] returnData)
+_AGGREGATE = b'\x25\x2d\xba\x42'
+_CALLS = abi.compile(("(address,bytes)[]",))
+_RETURNS = abi.compile(("uint256", "bytes[]"))
+
+
+class Multicall():
+    """
+===============
+Multicall class
+===============
+
+.. class:: Multicall(rpc, aggregator=None, block_number="latest")
+
+    :param rpc: a :ref:`RPC <lib.blockchain.ethereum.rpc>` instance
+    :param aggregator: the address of a Multicall aggregator contract, or None to send the calls as a JSON-RPC batch
+    :param block_number: the point in the blockchain at which the calls are executed
+
+    Create an empty group of calls. Calls are added with :meth:`add` and executed together with :meth:`call`.
+
+    With an aggregator, the calls are executed atomically in the same block (whose number is stored in :samp:`block`),
+    but if one of them reverts the whole group fails. With a JSON-RPC batch each call succeeds or fails on its own.
+
+    """
+    def __init__(self, rpc, aggregator=None, block_number="latest"):
+        self.rpc = rpc
+        self.aggregator = aggregator
+        self.block_number = block_number
+        self.block = None
+        self.results = []
+        self.errors = []
+        self._calls = []
+        self._request = None
+
+    def add(self, contract, function, args=()):
+        """
+.. method:: add(contract, function, args=())
+
+        :param contract: a :samp:`Contract` instance
+        :param function: the name of a function registered on *contract*
+        :param args: call arguments as a tuple
+
+        Add a call to the group and return its index, to be used with :meth:`result` and :meth:`error`.
+        The arguments are encoded immediately.
+
+        """
+        self._calls.append((contract, function, contract._calldata(function, args)))
+        self._request = None
+        return len(self._calls)-1
+
+    def clear(self):
+        """
+.. method:: clear()
+
+        Remove all the calls of the group.
+
+        """
+        self._calls = []
+        self._request = None
+        self.results = []
+        self.errors = []
+
+    def call(self):
+        """
+.. method:: call()
+
+        Execute all the calls of the group with a single request. Return True if every call succeeded.
+
+        The decoded results are stored in :samp:`results` (None for failed calls) and the error reasons in :samp:`errors`.
+        Results of functions registered without return types are returned as hexadecimal strings, as in :samp:`Contract.call`.
+
+        """
+        n = len(self._calls)
+        self.results = [None]*n
+        self.errors = [""]*n
+        if not n:
+            return True
+        if self.aggregator is None:
+            return self._batch()
+        return self._aggregate()
+
+    def result(self, idx):
+        """
+.. method:: result(idx)
+
+        Return the decoded result of the call at index *idx*, or None in case of error.
+
+        """
+        return self.results[idx]
+
+    def error(self, idx):
+        """
+.. method:: error(idx)
+
+        Return the error reason of the call at index *idx*, or an empty string if the call succeeded.
+
+        """
+        return self.errors[idx]
+
+    def _typed(self, i):
+        # True if the function of call i has been registered with return types
+        contract, function, calldata = self._calls[i]
+        return contract._functions[function][4] is not None
+
+    def _decode(self, i, data):
+        contract, function, calldata = self._calls[i]
+        try:
+            self.results[i] = contract._decode_result(function, data)
+        except Exception as e:
+            self.errors[i] = "malformed result"
+            return False
+        return True
+
+    def _fail(self, error):
+        for i in range(len(self._calls)):
+            self.errors[i] = error
+        return False
+
+    def _aggregate(self):
+        if self._request is None:
+            # calls are encoded once, for every execution of the same group
+            calls = []
+            for contract, function, calldata in self._calls:
+                calls.append((contract._address, calldata))
+            self._request = "0x"+ecc.bin_to_hex(abi.encode(_CALLS, (calls,), _AGGREGATE))
+        res, error = self.rpc.request("eth_call", [{"to": self.aggregator, "data": self._request}, self.block_number])
+        if res is None:
+            return self._fail(error)
+        try:
+            block, data = abi.decode(_RETURNS, ecc.hex_to_bin(res[2:]))
+        except Exception as e:
+            return self._fail("malformed result")
+        if len(data) != len(self._calls):
+            return self._fail("malformed result")
+        self.block = block
+        ok = True
+        for i in range(len(data)):
+            if self._typed(i):
+                ok = self._decode(i, data[i]) and ok
+            else:
+                self.results[i] = "0x"+ecc.bin_to_hex(data[i])
+        return ok
+
+    def _batch(self):
+        if self._request is None:
+            self._request = []
+            for contract, function, calldata in self._calls:
+                tx = {"to": contract._address, "data": "0x"+ecc.bin_to_hex(calldata)}
+                if contract._from is not None:
+                    tx["from"] = contract._from
+                self._request.append(tx)
+        b = self.rpc.batch()
+        for tx in self._request:
+            b.simpleCall(tx, self.block_number)
+        b.send()
+        ok = True
+        for i in range(len(self._calls)):
+            res = b.result(i)
+            if res is None:
+                self.errors[i] = b.error(i)
+                ok = False
+            elif self._typed(i):
+                ok = self._decode(i, ecc.hex_to_bin(res[2:])) and ok
+            else:
+                self.results[i] = res
+        return ok
@@ -0,0 +1,211 @@
+"""
+.. module:: nonce
+
+*****
+Nonce
+*****
+
+This module keeps track of the nonce of an Ethereum address locally, so that a network round trip
+to :ref:`rpc.getTransactionCount <lib.blockchain.ethereum.rpc.getTransactionCount>` is not needed before every transaction. ::
+
+    from blockchain.ethereum import rpc
+    from blockchain.ethereum import nonce
+
+    ...
+
+    eth = rpc.RPC(config.RPC_URL)
+    nonces = nonce.NonceManager(eth, config.ADDRESS)
+
+    n = nonces.next()
+    tx.set_nonce(n)
+    tx.sign(config.PRIVATE_KEY)
+    if eth.sendTransaction(tx.to_rlp()) is None:
+        nonces.failed(eth.last_error, n)
+
+
+    """
+
+import threading
+
+# node error messages meaning that the local nonce is out of sync
+_RESYNC_ERRORS = (
+    "nonce too low",
+    "replacement transaction underpriced",
+    "already known"
+)
+
+def is_resync_error(error):
+    """
+.. function:: is_resync_error(error)
+
+    Return True if the node error reason *error* means that the local nonce is out of sync
+    (i.e. "nonce too low" or "replacement transaction underpriced").
+
+    """
+    if type(error)!=PSTRING:
+        return False
+    error = error.lower()
+    for msg in _RESYNC_ERRORS:
+        if msg in error:
+            return True
+    return False
+
+class FileNonceStore():
+    """
+======================
+FileNonceStore class
+======================
+
+.. class:: FileNonceStore(path)
+
+    Persist the next nonce to the file at *path* (i.e. on a flash filesystem), so that it survives a reboot.
+
+    """
+    def __init__(self,path):
+        self.path = path
+
+    def load(self):
+        """
+.. method:: load()
+
+        Return the stored nonce or -1 if not available.
+
+        """
+        try:
+            f = open(self.path,"rb")
+            data = f.read()
+            f.close()
+            return int(str(data))
+        except Exception as e:
+            return -1
+
+    def save(self,nonce):
+        """
+.. method:: save(nonce)
+
+        Store *nonce*.
+
+        """
+        f = open(self.path,"wb")
+        f.write(str(nonce))
+        f.close()
+
+
+class NonceManager():
+    """
+===================
+NonceManager class
+===================
+
+.. class:: NonceManager(rpc,address,store=None)
+
+    Hand out increasing nonces for the transactions sent from *address*.
+
+    :samp:`rpc` must be a valid :ref:`RPC <lib.blockchain.ethereum.rpc>` instance, used to read the transaction count of *address*
+    the first time a nonce is needed and every time the local nonce is found out of sync.
+
+    :samp:`store` is an optional object with methods :samp:`load()` and :samp:`save(nonce)` (i.e. a :class:`FileNonceStore`) used to persist
+    the next nonce: if it holds a valid value, no network read is done at startup.
+
+    Nonces can be requested from different threads.
+
+    """
+    def __init__(self,rpc,address,store=None):
+        self._rpc = rpc
+        self._address = address
+        self._store = store
+        self._next = -1
+        self._lock = threading.Lock()
+        if store is not None:
+            self._next = store.load()
+
+    def sync(self):
+        """
+.. method:: sync()
+
+        Read the transaction count of the address from the node and restart handing out nonces from it.
+        Return the next nonce or -1 on error.
+
+        """
+        self._lock.acquire()
+        try:
+            self._sync()
+        finally:
+            self._lock.release()
+        return self._next
+
+    def _sync(self):
+        nt = self._rpc.getTransactionCount(self._address,"pending")
+        if nt>=0:
+            self._next = nt
+            self._save()
+        return nt
+
+    def _save(self):
+        if self._store is not None:
+            self._store.save(self._next)
+
+    def next(self):
+        """
+.. method:: next()
+
+        Return the nonce to use for the next transaction. Raise :samp:`IOError` if it can not be read from the node.
+
+        """
+        self._lock.acquire()
+        try:
+            if self._next<0 and self._sync()<0:
+                raise IOError
+            nonce = self._next
+            self._next+=1
+            self._save()
+        finally:
+            self._lock.release()
+        return nonce
+
+    def peek(self):
+        """
+.. method:: peek()
+
+        Return the next nonce without consuming it, -1 if not yet known.
+
+        """
+        return self._next
+
+    def failed(self,error,nonce=-1):
+        """
+.. method:: failed(error,nonce=-1)
+
+        :param error: the error reason of a failed transaction (i.e. :samp:`rpc.last_error`)
+        :param nonce: the nonce of the failed transaction
+
+        Notify that a transaction has not been accepted by the node, so that its nonce is not lost.
+
+        If *nonce* is the last one handed out and the error does not mean that the local nonce is out of sync
+        (i.e. "nonce too low" or "replacement transaction underpriced"), it is handed out again by the next call to :meth:`next`.
+        In every other case the nonce is read again from the node (pending transaction count) before handing out the next one.
+        Return True if a resync has been scheduled.
+
+        """
+        resync = nonce<0 or type(error)!=PSTRING or is_resync_error(error)
+        self._lock.acquire()
+        if not resync and self._next>=0 and nonce==self._next-1:
+            self._next = nonce
+        else:
+            self._next = -1
+            resync = True
+        self._save()
+        self._lock.release()
+        return resync
+
+    def reset(self,nonce):
+        """
+.. method:: reset(nonce)
+
+        Restart handing out nonces from *nonce*.
+
+        """
+        self._lock.acquire()
+        self._next = nonce
+        self._save()
+        self._lock.release()
@@ -0,0 +1,339 @@
+"""
+.. module:: outbox
+
+******
+Outbox
+******
+
+This module implements a persistent outbox for signed transactions, to be used when the device is offline.
+
+Transactions are appended to a log structured file (i.e. on a flash filesystem) used as a ring buffer of fixed capacity.
+Every record is protected by a CRC32 and transactions are never kept all together in RAM: when the link is back, they are
+read back and sent in nonce order, a few at a time, with batched requests. ::
+
+    from blockchain.ethereum import outbox
+
+    ...
+
+    box = outbox.Outbox("/flash/outbox.bin")
+
+    tx.sign(config.PRIVATE_KEY)
+    raw = tx.to_rlp()
+    if eth.sendTransaction(raw) is None:
+        box.append(raw)
+
+    ...
+
+    # once connected again
+    box.flush(eth)
+
+
+    """
+
+from blockchain.ethereum import rlp
+
+# magic, head, tail, used, capacity (4 bytes each)
+_MAGIC = b"OBX3"
+_HEADER = 20
+
+# record markers
+_LIVE = 0xa5
+_DONE = 0x00
+_WRAP = 0x5a
+
+# marker, length (2 bytes), nonce (4 bytes), crc32 of length, nonce and transaction (4 bytes)
+_RECORD = 11
+
+_CRC_TABLE = (
+    0x00000000, 0x1db71064, 0x3b6e20c8, 0x26d930ac, 0x76dc4190, 0x6b6b51f4, 0x4db26158, 0x5005713c,
+    0xedb88320, 0xf00f9344, 0xd6d6a3e8, 0xcb61b38c, 0x9b64c2b0, 0x86d3d2d4, 0xa00ae278, 0xbdbdf21c
+)
+
+def crc32(data, crc=0):
+    """
+.. function:: crc32(data, crc=0)
+
+    Return the CRC32 of *data*, continuing from *crc*. A 16 entries table is used to save flash.
+
+    """
+    crc = crc ^ 0xffffffff
+    for b in data:
+        crc = _CRC_TABLE[(crc ^ b) & 0x0f] ^ (crc >> 4)
+        crc = _CRC_TABLE[(crc ^ (b >> 4)) & 0x0f] ^ (crc >> 4)
+    return crc ^ 0xffffffff
+
+def _put(buf, ofs, value, n):
+    while n:
+        n -= 1
+        buf[ofs+n] = value & 0xff
+        value = value >> 8
+
+def _get(buf, ofs, n):
+    value = 0
+    for i in range(ofs, ofs+n):
+        value = (value << 8) | buf[i]
+    return value
+
+def tx_nonce(raw):
+    """
+.. function:: tx_nonce(raw)
+
+    Return the nonce of the signed transaction *raw*, in binary RLP form. Both legacy and typed transactions are supported.
+
+    """
+    idx = 0
+    if raw[0]<0xc0:
+        # typed transaction: skip the type byte, the nonce follows the chain id
+        raw = memoryview(raw)[1:]
+        idx = 1
+    for is_list, item in rlp.iter_items(raw):
+        if not idx:
+            return rlp.to_int(item)
+        idx-=1
+
+
+class Outbox():
+    """
+============
+Outbox class
+============
+
+.. class:: Outbox(path, capacity=8192)
+
+    Open (or create) the outbox stored in the file at *path*, holding up to *capacity* bytes of records.
+    Each record takes 11 bytes plus the size of the transaction.
+
+    The capacity is stored in the file when the outbox is created: an existing outbox keeps its own capacity and *capacity* is ignored.
+    A file that does not hold an outbox is overwritten, while errors reading an existing outbox are raised.
+
+    Records are read back in order and checked against their CRC: a corrupted record can not be skipped, since its length is not reliable.
+    In that case :samp:`corrupted` is set to True and the records from the corrupted one on are kept but not sent, until :meth:`clear` is called.
+
+    After a :meth:`flush`, the transactions refused by the node are listed in :samp:`rejected` as tuples :samp:`(nonce, error)`.
+
+    """
+    def __init__(self, path, capacity=8192):
+        self.capacity = capacity
+        self.rejected = []
+        self.corrupted = False
+        # create the file if missing, never truncate it
+        f = open(path, "ab")
+        f.close()
+        self._f = open(path, "r+b")
+        hdr = self._f.read(_HEADER)
+        if len(hdr) < _HEADER or hdr[0:4] != _MAGIC:
+            self._end = _HEADER+capacity
+            self.clear()
+            return
+        self._head = _get(hdr, 4, 4)
+        self._tail = _get(hdr, 8, 4)
+        self._used = _get(hdr, 12, 4)
+        # records are laid out on the ring of the capacity they were written with
+        self.capacity = _get(hdr, 16, 4)
+        self._end = _HEADER+self.capacity
+
+    def _write_header(self):
+        hdr = bytearray(_HEADER)
+        hdr[0:4] = _MAGIC
+        _put(hdr, 4, self._head, 4)
+        _put(hdr, 8, self._tail, 4)
+        _put(hdr, 12, self._used, 4)
+        _put(hdr, 16, self.capacity, 4)
+        self._f.seek(0)
+        self._f.write(hdr)
+        self._f.flush()
+
+    def _write_at(self, pos, data):
+        self._f.seek(pos)
+        self._f.write(data)
+
+    def _read_at(self, pos, n):
+        self._f.seek(pos)
+        return self._f.read(n)
+
+    def clear(self):
+        """
+.. method:: clear()
+
+        Remove all the records.
+
+        """
+        self._head = _HEADER
+        self._tail = _HEADER
+        self._used = 0
+        self.corrupted = False
+        self._write_header()
+
+    def free(self):
+        """
+.. method:: free()
+
+        Return the number of free bytes.
+
+        """
+        return self.capacity-self._used
+
+    def append(self, raw, nonce=None):
+        """
+.. method:: append(raw, nonce=None)
+
+        :param raw: a signed transaction in binary RLP form (i.e. the result of :samp:`Transaction.to_rlp()`)
+        :param nonce: the transaction nonce, decoded from *raw* if not given
+
+        Append the transaction to the outbox. Return False if there is not enough free space.
+
+        """
+        if nonce is None:
+            nonce = tx_nonce(raw)
+        size = _RECORD+len(raw)
+        waste = 0
+        if self._tail+size > self._end:
+            # the record does not fit before the end of the ring: wrap
+            waste = self._end-self._tail
+        if waste+size > self.free():
+            return False
+        if waste:
+            self._write_at(self._tail, bytes([_WRAP]))
+            self._tail = _HEADER
+            self._used += waste
+        rec = bytearray(_RECORD)
+        rec[0] = _LIVE
+        _put(rec, 1, len(raw), 2)
+        _put(rec, 3, nonce, 4)
+        _put(rec, 7, crc32(raw, crc32(memoryview(rec)[1:7])), 4)
+        self._write_at(self._tail, rec)
+        self._write_at(self._tail+_RECORD, raw)
+        self._tail += size
+        if self._tail == self._end:
+            self._tail = _HEADER
+        self._used += size
+        self._write_header()
+        return True
+
+    def _record(self, pos, left):
+        # return (marker, nonce, length) of the record at pos, None if corrupted; left is the number of used bytes from pos
+        rec = self._read_at(pos, _RECORD)
+        if len(rec) < _RECORD:
+            return None
+        marker = rec[0]
+        n = _get(rec, 1, 2)
+        if (marker != _LIVE and marker != _DONE) or _RECORD+n > left or pos+_RECORD+n > self._end:
+            return None
+        # the transaction is read only to be checked, one record at a time
+        if crc32(self._read_at(pos+_RECORD, n), crc32(memoryview(rec)[1:7])) != _get(rec, 7, 4):
+            return None
+        return marker, _get(rec, 3, 4), n
+
+    def _scan(self):
+        # return the list of (nonce, position, length) of live records, stopping at the first corrupted one
+        res = []
+        pos = self._head
+        left = self._used
+        while left > 0:
+            marker = self._read_at(pos, 1)[0]
+            if marker == _WRAP and self._end-pos <= left:
+                left -= self._end-pos
+                pos = _HEADER
+                continue
+            r = self._record(pos, left)
+            if r is None:
+                self.corrupted = True
+                break
+            if r[0] == _LIVE:
+                res.append((r[1], pos, r[2]))
+            pos += _RECORD+r[2]
+            left -= _RECORD+r[2]
+            if pos == self._end:
+                pos = _HEADER
+        return res
+
+    def pending(self):
+        """
+.. method:: pending()
+
+        Return the number of transactions waiting to be sent.
+
+        """
+        return len(self._scan())
+
+    def _read_tx(self, pos, n):
+        rec = self._read_at(pos, _RECORD+n)
+        raw = rec[_RECORD:]
+        if len(raw) != n or crc32(raw, crc32(memoryview(rec)[1:7])) != _get(rec, 7, 4):
+            return None
+        return raw
+
+    def _compact(self):
+        # advance the head past consumed records
+        while self._used > 0:
+            marker = self._read_at(self._head, 1)[0]
+            if marker == _WRAP and self._end-self._head <= self._used:
+                self._used -= self._end-self._head
+                self._head = _HEADER
+                continue
+            r = self._record(self._head, self._used)
+            if r is None:
+                self.corrupted = True
+                break
+            if r[0] == _LIVE:
+                break
+            n = _RECORD+r[2]
+            self._head += n
+            self._used -= n
+            if self._head == self._end:
+                self._head = _HEADER
+        if not self._used:
+            self._head = _HEADER
+            self._tail = _HEADER
+        self._write_header()
+
+    def flush(self, rpc, batch=8):
+        """
+.. method:: flush(rpc, batch=8)
+
+        :param rpc: a :ref:`RPC <lib.blockchain.ethereum.rpc>` instance
+        :param batch: the number of transactions sent with a single batched request
+
+        Send the stored transactions in nonce order, *batch* at a time, removing them from the outbox once accepted by the node.
+        Transactions refused by the node are removed too: unless already known or with a nonce already used, they are listed in :samp:`rejected`.
+        Records corrupted after being read are dropped. Sending stops at the first batch that can not be delivered to the node, to be resumed by the next flush.
+        Return the number of transactions removed from the outbox.
+
+        """
+        self.rejected = []
+        recs = self._scan()
+        # insertion sort by nonce: the index only holds small tuples
+        for i in range(1, len(recs)):
+            r = recs[i]
+            j = i-1
+            while j >= 0 and recs[j][0] > r[0]:
+                recs[j+1] = recs[j]
+                j -= 1
+            recs[j+1] = r
+        done = 0
+        i = 0
+        while i < len(recs):
+            b = rpc.batch()
+            chunk = recs[i:i+batch]
+            calls = []
+            for nonce, pos, n in chunk:
+                raw = self._read_tx(pos, n)
+                if raw is None:
+                    calls.append(-1)
+                else:
+                    calls.append(b.sendTransaction(raw))
+                    raw = None
+            if not b.send(retry=1) and not b.answered:
+                # the node has not been reached: keep the records for the next flush
+                break
+            for k in range(len(chunk)):
+                idx = calls[k]
+                if idx >= 0 and b.result(idx) is None:
+                    err = str(b.error(idx)).lower()
+                    if "known" not in err and "nonce too low" not in err:
+                        self.rejected.append((chunk[k][0], b.error(idx)))
+                self._write_at(chunk[k][1], bytes([_DONE]))
+                done += 1
+            i += batch
+        self._compact()
+        return done
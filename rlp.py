@@ -8,30 +8,144 @@ RLP
 
 This module implements the RLP encoding scheme for the Ethereum protocol.
 
+Encoding is performed in two passes over *obj*: the first one computes the exact size of every
+nested list, the second one writes prefixes and payloads in place into a single preallocated buffer.
+No intermediate buffer is created, whatever the nesting level of *obj*.
+
+Decoding never copies: strings are returned as memoryview slices of the original buffer.
+
 
     """
 
+def _int_len(x):
+    # number of bytes of the big endian representation of x, without leading zeros
+    if x<0:
+        # RLP has no negative integers (i.e. a -1 returned by a failed rpc call)
+        raise ValueError
+    n = 0
+    while x:
+        n+=1
+        x = x>>8
+    return n
+
 def _to_bytes(x):
     if type(x) == PSMALLINT or type(x)==PINTEGER:
-        if x==0:
-            return b''
         # big endian, no leading 0
-        ret = bytearray(4)
-        ret[0] = (x>>24)&0xff
-        ret[1] = (x>>16)&0xff
-        ret[2] = (x>>8)&0xff
-        ret[3] = (x)&0xff
-        j = -1
-        for i in range(0,3):
-            if ret[i]==0:
-                j=i
-            else:
-                break
-        return ret[j+1:]
+        n = _int_len(x)
+        ret = bytearray(n)
+        while n:
+            n-=1
+            ret[n] = x&0xff
+            x = x>>8
+        return ret
     if type(x) in (PSTRING,PBYTES,PBYTEARRAY):
         return x
 
 
+def _item_len(x):
+    # length of the payload of a non list item
+    if type(x) == PSMALLINT or type(x)==PINTEGER:
+        return _int_len(x)
+    return len(x)
+
+def _prefix_len(l):
+    if l<56:
+        return 1
+    return 1+_int_len(l)
+
+def _size(obj,sizes):
+    # return the encoded size of obj, appending payload sizes of lists to sizes in pre-order
+    if type(obj) in (PLIST,PTUPLE):
+        pos = len(sizes)
+        sizes.append(0)
+        l = 0
+        for item in obj:
+            l+=_size(item,sizes)
+        sizes[pos] = l
+        return _prefix_len(l)+l
+    l = _item_len(obj)
+    if l==1 and _first_byte(obj)<128:
+        return 1
+    return _prefix_len(l)+l
+
+def _first_byte(x):
+    if type(x) == PSMALLINT or type(x)==PINTEGER:
+        return x
+    return x[0]
+
+def _write_length(buf,offset,l,ofs):
+    if l<56:
+        buf[offset] = l+ofs
+        return offset+1
+    n = _int_len(l)
+    buf[offset] = n+ofs+55
+    offset+=n
+    end = offset+1
+    while n:
+        buf[offset] = l&0xff
+        l = l>>8
+        offset-=1
+        n-=1
+    return end
+
+def _write(obj,buf,offset,sizes,si):
+    # write obj at offset, return (next offset, next index in sizes)
+    if type(obj) in (PLIST,PTUPLE):
+        offset = _write_length(buf,offset,sizes[si],192)
+        si+=1
+        for item in obj:
+            offset,si = _write(item,buf,offset,sizes,si)
+        return offset,si
+    if type(obj) == PSMALLINT or type(obj)==PINTEGER:
+        n = _int_len(obj)
+        if n==1 and obj<128:
+            buf[offset] = obj
+            return offset+1,si
+        offset = _write_length(buf,offset,n,128)
+        end = offset+n
+        while n:
+            n-=1
+            buf[offset+n] = obj&0xff
+            obj = obj>>8
+        return end,si
+    n = len(obj)
+    if n==1 and obj[0]<128:
+        buf[offset] = obj[0]
+        return offset+1,si
+    offset = _write_length(buf,offset,n,128)
+    buf[offset:offset+n] = obj
+    return offset+n,si
+
+
+def encoded_size(obj):
+    """
+.. function:: encoded_size(obj)
+
+    :param obj: the object to encode
+
+    Return the exact number of bytes of the RLP representation of *obj*.
+
+    """
+    return _size(obj,[])
+
+def encode_into(obj,buf,offset=0):
+    """
+.. function:: encode_into(obj,buf,offset=0)
+
+    :param obj: the object to encode
+    :param buf: a bytearray receiving the encoding
+    :param offset: position in *buf* where the encoding starts
+
+    Write the RLP representation of *obj* into *buf* starting at *offset* and return the offset of the first byte after it.
+    *buf* must be large enough to hold the encoding (see :func:`encoded_size`); the same *buf* can be reused
+    as a scratch area across many encodings.
+
+    """
+    sizes = []
+    if offset+_size(obj,sizes)>len(buf):
+        raise IndexError
+    return _write(obj,buf,offset,sizes,0)[0]
+
 def encode(obj):
     """
 .. function:: encode(obj)
@@ -40,35 +154,120 @@ def encode(obj):
 
 	Return the RLP representation of *obj*.
 	Only lists, tuples, strings, bytes/bytearrays and integers are allowed as types for *obj*.
+	Integers must not be negative, otherwise :samp:`ValueError` is raised.
 
     """
-    if type(obj) in (PLIST,PTUPLE):
-        b = bytearray()
-        for item in obj:
-            ii = encode(item)
-            b.extend(ii)
-        return encode_length(len(b),192)+b
-    else:
-        b = _to_bytes(obj)
-        if len(b)==1 and b[0]<128:
-            return b
-        else:
-            return encode_length(len(b),128)+b
+    sizes = []
+    buf = bytearray(_size(obj,sizes))
+    _write(obj,buf,0,sizes,0)
+    return buf
 
 
 def encode_length(l,ofs):
-    b = bytearray(1)
-    if l<56:
-        b[0] = l+ofs
-        return b
-    else:
-        bl = to_binary(l)
-        b[0] = len(bl)+ofs+55
-        return b+bl
+    b = bytearray(_prefix_len(l))
+    _write_length(b,0,l,ofs)
+    return b
 
 def to_binary(x):
-    m = bytearray(1)
-    m[0]=x%256
-    return '' if x == 0 else to_binary(x // 256) + m
+    return _to_bytes(x)
+
+
+def _read_item(buf,pos,end):
+    # return (is_list, payload start, payload end) of the item at pos
+    if pos>=end:
+        raise ValueError
+    b = buf[pos]
+    if b<128:
+        return False,pos,pos+1
+    if b<184:
+        start = pos+1
+        l = b-128
+        is_list = False
+    elif b<192:
+        n = b-183
+        start = pos+1+n
+        if start>end:
+            raise ValueError
+        l = 0
+        for i in range(pos+1,start):
+            l = (l<<8)|buf[i]
+        is_list = False
+    elif b<248:
+        start = pos+1
+        l = b-192
+        is_list = True
+    else:
+        n = b-247
+        start = pos+1+n
+        if start>end:
+            raise ValueError
+        l = 0
+        for i in range(pos+1,start):
+            l = (l<<8)|buf[i]
+        is_list = True
+    if start+l>end:
+        raise ValueError
+    return is_list,start,start+l
+
+def iter_items(buf):
+    """
+.. function:: iter_items(buf)
+
+    :param buf: bytes, bytearray or memoryview containing an RLP encoded list
 
+    Iterate lazily over the elements of the RLP list encoded in *buf*, yielding a tuple :samp:`(is_list, view)` for each of them.
+    For strings, *view* is a memoryview slice of *buf* holding the string payload; for nested lists, *view* is a memoryview slice
+    holding the whole encoded list, that can be passed again to :func:`iter_items`.
 
+    """
+    mv = memoryview(buf)
+    is_list,pos,end = _read_item(mv,0,len(mv))
+    if not is_list:
+        raise ValueError
+    while pos<end:
+        is_list,start,stop = _read_item(mv,pos,end)
+        if is_list:
+            yield True,mv[pos:stop]
+        else:
+            yield False,mv[start:stop]
+        pos = stop
+
+def _decode(mv,pos,end):
+    is_list,start,stop = _read_item(mv,pos,end)
+    if not is_list:
+        return mv[start:stop],stop
+    res = []
+    while start<stop:
+        item,start = _decode(mv,start,stop)
+        res.append(item)
+    return res,stop
+
+def decode(buf):
+    """
+.. function:: decode(buf)
+
+    :param buf: bytes, bytearray or memoryview containing an RLP encoded item
+
+    Return the object encoded in *buf*: lists are decoded as lists, strings as memoryview slices of *buf*.
+    No element payload is copied. Raise :samp:`ValueError` if *buf* is not a valid RLP encoding.
+
+    """
+    mv = memoryview(buf)
+    res,pos = _decode(mv,0,len(mv))
+    if pos!=len(mv):
+        raise ValueError
+    return res
+
+def to_int(view):
+    """
+.. function:: to_int(view)
+
+    :param view: a decoded RLP string
+
+    Return the big endian integer represented by *view*.
+
+    """
+    x = 0
+    for b in view:
+        x = (x<<8)|b
+    return x
@@ -24,17 +24,543 @@ This module allows calling the JSON-RPC endpoints of a geth node. ::
     print("Transaction Count:",nonce)
     print("Chain:",eth.getChainId())
 
+Many calls can be sent to the node with a single request using a :class:`Batch`: ::
+
+    with eth.batch() as b:
+        balance = b.getBalance(address)
+        nonce = b.getTransactionCount(address)
+
+    print("Balance:",b.result(balance))
+    print("Transaction Count:",b.result(nonce))
+
 
 
     """
 
 # rpc interface to node
 import socket
+import ssl
+import json
+import timers
+import threading
 import requests
 from bignum import bignum
+from crypto.ecc import ecc as ecc
 
 bg = bignum.BigNum
 
+def _gas_price(r):
+    if r:
+        return bg(r)
+    return 0
+
+def _chain_id(r):
+    if r is not None:
+        return str(r)
+    return 0
+
+def _tx_count(r):
+    if r:
+        return int(r,16)
+    return -1
+
+
+class _Connection():
+    # a persistent HTTP/1.1 connection to a single node
+
+    def __init__(self,url,ctx=None):
+        self.ctx = ctx
+        self.https = False
+        if url.startswith("https://"):
+            self.https = True
+            url = url[8:]
+        elif url.startswith("http://"):
+            url = url[7:]
+        pos = url.find("/")
+        if pos>=0:
+            self.path = url[pos:]
+            url = url[:pos]
+        else:
+            self.path = "/"
+        pos = url.find(":")
+        if pos>=0:
+            self.host = url[:pos]
+            self.port = int(url[pos+1:])
+        else:
+            self.host = url
+            self.port = 443 if self.https else 80
+        self.sock = None
+        self.buf = bytearray()
+        self.handshakes = 0
+        self.requests = 0
+
+    def connect(self):
+        self.close()
+        if self.https:
+            ctx = self.ctx
+            if ctx is None:
+                ctx = ssl.create_ssl_context()
+            sock = ssl.sslsocket(ctx=ctx)
+        else:
+            sock = socket.socket()
+        sock.connect((socket.gethostbyname(self.host),self.port))
+        self.sock = sock
+        self.buf = bytearray()
+        self.handshakes+=1
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception as e:
+                pass
+            self.sock = None
+
+    def _fill(self):
+        data = self.sock.recv(512)
+        if not data:
+            raise IOError
+        self.buf.extend(data)
+
+    def _readline(self):
+        while True:
+            pos = self.buf.find(b"\r\n")
+            if pos>=0:
+                line = self.buf[:pos]
+                self.buf = self.buf[pos+2:]
+                return line
+            self._fill()
+
+    def _read(self,n):
+        while len(self.buf)<n:
+            self._fill()
+        data = self.buf[:n]
+        self.buf = self.buf[n:]
+        return data
+
+    def send(self,body):
+        # send a POST request with body, reconnecting once if the kept alive socket was closed by the node
+        req = bytearray("POST "+self.path+" HTTP/1.1\r\nHost: "+self.host+"\r\nContent-Type: application/json\r\nContent-Length: "+str(len(body))+"\r\nConnection: keep-alive\r\n\r\n")
+        req.extend(body)
+        reused = self.sock is not None
+        for attempt in range(2):
+            if self.sock is None:
+                self.connect()
+            try:
+                self.sock.sendall(req)
+                status,length,chunked,close = self._read_head()
+                break
+            except Exception as e:
+                self.close()
+                if not reused or attempt:
+                    raise e
+        self.requests+=1
+        return status,length,chunked,close
+
+    def _read_head(self):
+        status = int(str(self._readline()).split(" ")[1])
+        length = -1
+        chunked = False
+        close = False
+        while True:
+            line = str(self._readline())
+            if not line:
+                break
+            pos = line.find(":")
+            if pos<0:
+                continue
+            name = line[:pos].strip().lower()
+            value = line[pos+1:].strip().lower()
+            if name=="content-length":
+                length = int(value)
+            elif name=="transfer-encoding" and value=="chunked":
+                chunked = True
+            elif name=="connection" and value=="close":
+                close = True
+        return status,length,chunked,close
+
+    def read_body(self,length,chunked,close):
+        if chunked:
+            body = bytearray()
+            while True:
+                n = int(str(self._readline()).split(";")[0],16)
+                if not n:
+                    self._readline()
+                    break
+                body.extend(self._read(n))
+                self._readline()
+        elif length>=0:
+            body = self._read(length)
+        else:
+            # no length: the body ends when the node closes the connection
+            try:
+                while True:
+                    self._fill()
+            except Exception as e:
+                pass
+            body = self.buf
+            self.buf = bytearray()
+            close = True
+        if close:
+            self.close()
+        return body
+
+    def iter_body(self,length,chunked,close):
+        # yield the body in pieces as they are received
+        if chunked:
+            while True:
+                n = int(str(self._readline()).split(";")[0],16)
+                if not n:
+                    self._readline()
+                    break
+                while n:
+                    if not self.buf:
+                        self._fill()
+                    data = self.buf[:n]
+                    self.buf = self.buf[len(data):]
+                    n-=len(data)
+                    yield data
+                self._readline()
+        elif length>=0:
+            while length:
+                if not self.buf:
+                    self._fill()
+                data = self.buf[:length]
+                self.buf = self.buf[len(data):]
+                length-=len(data)
+                yield data
+        else:
+            close = True
+            while True:
+                if self.buf:
+                    data = self.buf
+                    self.buf = bytearray()
+                    yield data
+                try:
+                    self._fill()
+                except Exception as e:
+                    break
+        if close:
+            self.close()
+
+    def post(self,js):
+        status,length,chunked,close = self.send(json.dumps(js))
+        body = self.read_body(length,chunked,close)
+        if status!=200:
+            raise IOError
+        return json.loads(str(body))
+
+
+# JSON characters
+_LBRACE = __ORD("{")
+_RBRACE = __ORD("}")
+_LBRACKET = __ORD("[")
+_RBRACKET = __ORD("]")
+_COMMA = __ORD(",")
+_COLON = __ORD(":")
+_QUOTE = __ORD('"')
+_BACKSLASH = __ORD("\\")
+_SPACE = __ORD(" ")
+_LF = __ORD("\n")
+_CR = __ORD("\r")
+_TAB = __ORD("\t")
+
+class _JSONStream():
+    # incremental JSON tokenizer: extract one by one the elements of the array found at path,
+    # and the "error" member of the response, keeping in memory a single element at a time
+
+    def __init__(self,path):
+        self.path = path
+        self.stack = bytearray()    # open containers: '{' or '['
+        self.keys = []              # current key for every open container
+        self.in_str = False
+        self.esc = False
+        self.expect_key = False
+        self.key = None             # bytes of the string being read as a key
+        self.target = -1            # depth of the streamed array, -1 if not inside it
+        self.elem = None            # bytes of the element being captured
+        self.elem_depth = 0
+        self.error = None
+
+    def _at_path(self):
+        # True if the value about to start is at self.path
+        if len(self.stack)!=len(self.path):
+            return False
+        for i in range(len(self.path)):
+            if self.stack[i]!=_LBRACE or self.keys[i]!=self.path[i]:
+                return False
+        return True
+
+    def _is_error(self):
+        return len(self.stack)==1 and self.keys[0]=="error"
+
+    def _end_elem(self,res):
+        if self.elem is not None:
+            v = json.loads(str(self.elem))
+            if self.target>=0:
+                res.append(v)
+            else:
+                self.error = v
+            self.elem = None
+
+    def feed(self,data):
+        res = []
+        for c in data:
+            if self.elem is not None:
+                self.elem.append(c)
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif c==_BACKSLASH:
+                    self.esc = True
+                elif c==_QUOTE:
+                    self.in_str = False
+                    if self.key is not None:
+                        self.keys[-1] = str(self.key)
+                        self.key = None
+                elif self.key is not None:
+                    self.key.append(c)
+                continue
+            if c==_SPACE or c==_LF or c==_CR or c==_TAB or c==_COLON:
+                continue
+            depth = len(self.stack)
+            starts = self.elem is None and c!=_COMMA and c!=_RBRACKET and c!=_RBRACE
+            if starts and self.target>=0 and depth==self.target:
+                # a new element of the streamed array
+                self.elem = bytearray()
+                self.elem.append(c)
+                self.elem_depth = depth
+            elif starts and self.target<0 and self._is_error() and not self.expect_key:
+                # the value of the error member
+                self.elem = bytearray()
+                self.elem.append(c)
+                self.elem_depth = depth
+            if c==_QUOTE:
+                self.in_str = True
+                if self.expect_key:
+                    self.key = bytearray()
+                    self.expect_key = False
+            elif c==_LBRACE or c==_LBRACKET:
+                if c==_LBRACKET and self.target<0 and self.elem is None and self._at_path():
+                    self.target = depth+1
+                self.stack.append(c)
+                self.keys.append(None)
+                self.expect_key = c==_LBRACE
+            elif c==_RBRACE or c==_RBRACKET:
+                if self.elem is not None and depth==self.elem_depth:
+                    # scalar element ended by the closing bracket
+                    self.elem = self.elem[:-1]
+                    self._end_elem(res)
+                self.stack = self.stack[:-1]
+                self.keys.pop()
+                if self.target==depth:
+                    self.target = -1
+                elif self.elem is not None and len(self.stack)==self.elem_depth:
+                    self._end_elem(res)
+                self.expect_key = False
+            elif c==_COMMA:
+                if self.elem is not None and depth==self.elem_depth:
+                    self.elem = self.elem[:-1]
+                    self._end_elem(res)
+                self.expect_key = self.stack[-1]==_LBRACE
+                if self.expect_key:
+                    self.keys[-1] = None
+        return res
+
+
+class RetryPolicy():
+    """
+===================
+RetryPolicy class
+===================
+
+.. class:: RetryPolicy(retries=10,base=0,factor=2,cap=10000,jitter=True,deadline=0)
+
+    Define how failed calls are retried by :class:`RPC`.
+
+    :param retries: maximum number of attempts, 0 for no limit (a *deadline* should be given then)
+    :param base: delay in milliseconds before the second attempt
+    :param factor: multiplier applied to the delay after each attempt
+    :param cap: maximum delay in milliseconds between two attempts
+    :param jitter: if True, each delay is drawn uniformly between 0 and the exponential delay ("full jitter"), so that many devices do not retry in lockstep
+    :param deadline: maximum time in milliseconds spent on a call including delays, 0 for no limit
+
+    Only transient failures are retried: network errors, HTTP errors and malformed responses.
+    A JSON-RPC error returned by the node (i.e. "nonce too low") is never retried.
+
+    The default policy of :class:`RPC` retries immediately up to the *retry* argument of each call. ::
+
+        # exponential backoff: 250ms, 500ms, 1s, ... up to 8s, giving up after 30s
+        eth = rpc.RPC(url, retry_policy=rpc.RetryPolicy(retries=0, base=250, cap=8000, deadline=30000))
+
+    """
+    def __init__(self,retries=10,base=0,factor=2,cap=10000,jitter=True,deadline=0):
+        self.retries = retries
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def delay(self,attempt,started):
+        """
+.. method:: delay(attempt,started)
+
+        :param attempt: the number of attempts already made
+        :param started: the value of :samp:`timers.now()` when the first attempt was made
+
+        Return the milliseconds to wait before the next attempt or -1 to give up.
+
+        """
+        if self.retries and attempt>=self.retries:
+            return -1
+        wait = self.base
+        for i in range(attempt-1):
+            wait*=self.factor
+            if wait>=self.cap:
+                break
+        if wait>self.cap:
+            wait = self.cap
+        if self.jitter and wait>0:
+            wait = random(0,wait)
+        if self.deadline and timers.now()-started+wait>=self.deadline:
+            return -1
+        return wait
+
+
+class ResponseCache():
+    """
+===================
+ResponseCache class
+===================
+
+.. class:: ResponseCache(size=16,ttl=None)
+
+    Create a cache for the results of :class:`RPC` calls, keyed by method and parameters.
+
+    :param size: maximum number of cached results; when full, the least recently used one is evicted
+    :param ttl: a dictionary mapping method names to the time to live of their results in milliseconds, updating the default ones
+
+    A time to live of -1 keeps the result forever, 0 disables caching. By default:
+
+    * :samp:`net_version` and :samp:`eth_chainId` are cached forever
+    * :samp:`eth_gasPrice` is cached for 15 seconds
+    * :samp:`eth_call`, :samp:`eth_getBalance` and :samp:`eth_getCode` are cached forever when called at a concrete block number (i.e. :samp:`"0x5bad55"`), and not cached when called at a block tag like :samp:`"latest"`
+
+    The number of cache hits and misses is kept in :samp:`hits` and :samp:`misses`. ::
+
+        eth = rpc.RPC(url, cache=rpc.ResponseCache())
+
+    """
+    def __init__(self,size=16,ttl=None):
+        self.size = size
+        self.ttl = {
+            "net_version":-1,
+            "eth_chainId":-1,
+            "eth_gasPrice":15000
+        }
+        self.pinned = ("eth_call","eth_getBalance","eth_getCode")
+        if ttl:
+            for method in ttl:
+                self.ttl[method] = ttl[method]
+        self.hits = 0
+        self.misses = 0
+        self._keys = []
+        self._entries = {}
+
+    def _ttl(self,method,params):
+        if method in self.pinned and len(params):
+            block = params[-1]
+            if type(block)==PSTRING and block.startswith("0x"):
+                return -1
+            return 0
+        return self.ttl.get(method,0)
+
+    def get(self,method,params):
+        """
+.. method:: get(method,params)
+
+        Return a tuple :samp:`(hit, result)` for a call to *method* with *params*.
+
+        """
+        if not self._ttl(method,params):
+            return False,None
+        key = method+json.dumps(params)
+        if key in self._entries:
+            expiry,res = self._entries[key]
+            self._keys.remove(key)
+            if expiry<0 or timers.now()<expiry:
+                self._keys.append(key)
+                self.hits+=1
+                return True,res
+            del self._entries[key]
+        self.misses+=1
+        return False,None
+
+    def put(self,method,params,res):
+        """
+.. method:: put(method,params,res)
+
+        Store the result *res* of a call to *method* with *params*, if cacheable.
+
+        """
+        ttl = self._ttl(method,params)
+        if not ttl:
+            return
+        key = method+json.dumps(params)
+        if key in self._entries:
+            self._keys.remove(key)
+        elif len(self._keys)>=self.size:
+            del self._entries[self._keys.pop(0)]
+        self._keys.append(key)
+        self._entries[key] = (-1 if ttl<0 else timers.now()+ttl,res)
+
+    def clear(self):
+        """
+.. method:: clear()
+
+        Remove all the cached results.
+
+        """
+        self._keys = []
+        self._entries = {}
+
+
+# methods not modifying the blockchain, safe to be sent to more than one node
+_READ_METHODS = (
+    "net_version",
+    "eth_chainId",
+    "eth_gasPrice",
+    "eth_feeHistory",
+    "eth_blockNumber",
+    "eth_getBalance",
+    "eth_getTransactionCount",
+    "eth_getCode",
+    "eth_call",
+    "eth_estimateGas",
+    "eth_getBlockByNumber",
+    "eth_getBlockByHash",
+    "eth_getTransactionByHash",
+    "eth_getTransactionReceipt",
+    "eth_getLogs"
+)
+
+def _is_read(js):
+    if type(js)==PLIST:
+        for r in js:
+            if r["method"] not in _READ_METHODS:
+                return False
+        return True
+    return js["method"] in _READ_METHODS
+
+def _raw_tx(tx):
+    # signed transactions can be given in binary form: hex is produced here, once
+    if type(tx)!=PSTRING:
+        return "0x"+ecc.bin_to_hex(tx)
+    if not tx.startswith("0x"):
+        tx="0x"+tx
+    return tx
+
 class RPC():
     """
 .. _lib.blockchain.ethereum.rpc:
@@ -42,63 +568,269 @@ class RPC():
 RPC class
 =========
 
-.. class:: RPC(host)
+.. class:: RPC(host,additional_params=dict(),ssl_ctx=None,keep_alive=False,retry_policy=None,cache=None)
 
     Initialize a RPC instance with the geth node at *host*.
     *host* must also contain the port and the protocol (i.e. :samp:`https://mynode.com:8545`)
 
+    If *keep_alive* is True, a single HTTP(S) connection to the node is kept open and reused across calls,
+    avoiding a new TLS handshake for every call. The connection is transparently reopened when the node closes it.
+
+    If *retry_policy* is given, it must be a :class:`RetryPolicy` and replaces the *retry* argument of all calls.
+
+    If *cache* is given, it must be a :class:`ResponseCache`: results of slowly changing calls are then served from it.
+
+    An instance can be shared by many threads: with *keep_alive*, requests are serialized by a lock, so that they never interleave on the persistent connection
+    (the lock is not held while waiting to retry).
+    The :samp:`last_error` attribute is shared too and can be overwritten by calls made from other threads: threads needing the error reason of
+    a specific call should use :meth:`request`, that returns it together with the result.
+
     """
-    def __init__(self,host,additional_params=dict(),ssl_ctx=None):
+    def __init__(self,host,additional_params=dict(),ssl_ctx=None,keep_alive=False,retry_policy=None,cache=None):
         self.host = host
         self.net = 0
         self.balance = bg(0)
         self.last_error = ""
         self.additional_params = additional_params
         self.ssl_ctx = ssl_ctx
+        self._conn = _Connection(host,ssl_ctx) if keep_alive else None
+        self._lock = threading.Lock()
+        # requests served without a new handshake by persistent connections already discarded
+        self._saved = 0
+        self.retry_policy = retry_policy
+        self.cache = cache
 
-    def call(self,method,params=(),retry=10):
+    def call(self,method,params=(),retry=10,policy=None):
         """
-.. method:: call(method,params=(),retry=10)
+.. method:: call(method,params=(),retry=10,policy=None)
 
     :param method: the endpoint to call
     :param params: the list of parameters for the endpoint
-    :param retry: the number of call retries before failing
+    :param retry: the number of call attempts before failing, ignored if a :class:`RetryPolicy` is set
+    :param policy: a :class:`RetryPolicy` for this call only
 
     Call endpoint *method* with params *params*. Return the :samp:`result` field of the
     endpoint json response or None in case of error. Error reason can be retrieved in :samp:`self.last_error`.
 
+    Only transient failures are retried: if the node answers with a JSON-RPC error, None is returned immediately.
+
         """
-        self.last_error = ""
+        res,self.last_error = self.request(method,params,retry,policy)
+        return res
+
+    def request(self,method,params=(),retry=10,policy=None):
+        """
+.. method:: request(method,params=(),retry=10,policy=None)
+
+    Same as :meth:`call`, but return a tuple :samp:`(result, error)` where *error* is the error reason or an empty string.
+    Unlike :samp:`last_error`, the error reason is not shared with the calls made by other threads.
+
+        """
+        if self.cache is not None:
+            hit,res = self.cache.get(method,params)
+            if hit:
+                return res,""
+        rj,error = self.response(method,params,retry,policy)
+        if rj is None:
+            return None,error
+        if "error" in rj:
+            return None,rj["error"]["message"]
+        if self.cache is not None and rj["result"] is not None:
+            self.cache.put(method,params,rj["result"])
+        return rj["result"],""
+
+    def response(self,method,params=(),retry=10,policy=None):
+        """
+.. method:: response(method,params=(),retry=10,policy=None)
+
+    Same as :meth:`request`, but return a tuple :samp:`(response, error)` where *response* is the json response of the node,
+    holding either a :samp:`result` or an :samp:`error` field, or None if the node could not be reached (the reason is then in *error*).
+    It allows telling a call refused by the node from a call that may not have reached it. Responses are never cached.
+
+        """
+        return self._exchange(self._request(method,params,1),retry,policy)
+
+    def _exchange(self,js,retry,policy):
+        # post js, retrying transient failures according to the policy; return the json response (or None) and the error reason
+        if policy is None:
+            policy = self.retry_policy
+        if policy is None:
+            policy = RetryPolicy(retry,jitter=False)
+        started = timers.now()
+        attempt = 0
+        # nodes already tried by this call, for pools
+        tried = []
+        while True:
+            attempt += 1
+            error = ""
+            try:
+                rj = self._post(js,tried)
+                if type(rj)==PLIST:
+                    # an array answers a batch only
+                    if type(js)==PLIST:
+                        return rj,""
+                    error = "malformed response"
+                elif type(rj)==PDICT and ("result" in rj or "error" in rj):
+                    return rj,""
+                else:
+                    error = rj
+                raise Exception
+            except Exception as e:
+                if error == "":
+                    error = str(e)
+            wait = policy.delay(attempt,started)
+            if wait<0:
+                return None,error
+            if wait:
+                sleep(wait)
+
+    def _request(self,method,params,id):
         js = {
             "jsonrpc":"2.0",
             "method":method,
-            "id":1,
+            "id":id,
             "params":params
         }
         for param in self.additional_params:
             # Join additional parameters to basic ones
             js[param] = self.additional_params[param]
+        return js
 
-        while True:
+    def _post(self,js,tried=None):
+        # send js to the node and return the decoded json response
+        if self._conn is not None:
+            # one exchange at a time: the persistent connection can't carry interleaved requests
+            self._lock.acquire()
             try:
-                res = requests.post(self.host,json=js,ctx=self.ssl_ctx)
-                if res:
-                    rj = res.json()
-                    if "error" in rj:
-                        self.last_error = rj["error"]["message"]
-                        raise Exception
-                    elif "result" in rj:
-                        return rj["result"]
-                    else:
-                        self.last_error = rj
-                        raise Exception
-            except Exception as e:
-                retry -= 1
-                if self.last_error == "":
-                    self.last_error = str(e)
-                if not retry:
-                    break
-        return None
+                return self._conn.post(js)
+            finally:
+                self._lock.release()
+        res = requests.post(self.host,json=js,ctx=self.ssl_ctx)
+        if not res:
+            raise IOError
+        return res.json()
+
+    def stream(self,method,params=(),path=("result",)):
+        """
+.. method:: stream(method,params=(),path=("result",))
+
+    :param method: the endpoint to call
+    :param params: the list of parameters for the endpoint
+    :param path: the sequence of keys leading to the array to iterate in the json response
+
+    Call endpoint *method* with params *params* and return a generator yielding, one at a time, the elements of the array found
+    at *path* in the json response (by default the :samp:`result` array). The response is parsed incrementally while it is received,
+    so that memory usage does not depend on the number of elements. ::
+
+        # iterate over the transactions of a block
+        for tx in eth.stream("eth_getBlockByNumber", ["0x5bad55", True], ("result", "transactions")):
+            print(tx["hash"])
+
+    Streamed calls are never retried nor cached. On error the generator stops and the reason can be retrieved in :samp:`self.last_error`.
+    If the iteration is interrupted before the end, the connection to the node is closed.
+
+    The response is read from a connection reserved to the stream, so other calls can be made while iterating: with *keep_alive*,
+    the persistent connection is taken by the stream and the other calls use a new one; the stream connection is kept
+    for later calls if the new one has not been needed in the meantime.
+
+        """
+        self.last_error = ""
+        shared = self._conn is not None
+        if shared:
+            self._lock.acquire()
+            conn = self._conn
+            self._conn = _Connection(self.host,self.ssl_ctx)
+            self._lock.release()
+        else:
+            conn = _Connection(self.host,self.ssl_ctx)
+        done = False
+        try:
+            status,length,chunked,close = conn.send(json.dumps(self._request(method,params,1)))
+            if status!=200:
+                self.last_error = "HTTP error "+str(status)
+            else:
+                parser = _JSONStream(path)
+                for piece in conn.iter_body(length,chunked,close):
+                    for item in parser.feed(piece):
+                        yield item
+                if parser.error is not None:
+                    self.last_error = parser.error["message"] if type(parser.error)==PDICT else parser.error
+                done = True
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            if not done:
+                conn.close()
+            if shared:
+                self._give_back(conn)
+            else:
+                conn.close()
+
+    def _give_back(self,conn):
+        # reinstate the persistent connection used by a stream, unless a new one has been opened meanwhile
+        self._lock.acquire()
+        if conn.sock is not None and self._conn.sock is None and not self._conn.requests:
+            self._conn = conn
+        else:
+            conn.close()
+            self._saved+=conn.requests-conn.handshakes
+        self._lock.release()
+
+    def streamLogs(self,flt):
+        """
+.. method:: streamLogs(flt)
+
+    :param flt: a filter object as a dictionary, see :meth:`getLogs`
+
+    Return a generator yielding one at a time the logs matching *flt*, see :meth:`stream`.
+
+        """
+        return self.stream("eth_getLogs",[flt])
+
+    def streamBlockTransactions(self,block_number="latest"):
+        """
+.. method:: streamBlockTransactions(block_number="latest")
+
+    Return a generator yielding one at a time the full transaction objects of block *block_number*, see :meth:`stream`.
+
+        """
+        return self.stream("eth_getBlockByNumber",[block_number,True],("result","transactions"))
+
+    def close(self):
+        """
+.. method:: close()
+
+    Close the persistent connection to the node, if any. It will be reopened by the next call.
+
+        """
+        if self._conn is not None:
+            self._conn.close()
+
+    def handshakes_saved(self):
+        """
+.. method:: handshakes_saved()
+
+    Return the number of connections (and TLS handshakes) avoided by reusing the persistent connection.
+    Always 0 if *keep_alive* is False.
+
+        """
+        if self._conn is None:
+            return 0
+        return self._saved+self._conn.requests-self._conn.handshakes
+
+    def batch(self):
+        """
+.. method:: batch()
+
+    Return a new :class:`Batch` bound to this instance, to send many calls with a single JSON-RPC request. ::
+
+        with eth.batch() as b:
+            balance = b.getBalance(address)
+            nonce = b.getTransactionCount(address)
+        print(b.result(balance), b.result(nonce))
+
+        """
+        return Batch(self)
 
     #parameters as 0x strings
     def getBalance(self,address,block_number="latest"):
@@ -120,10 +852,7 @@ RPC class
     Return the current gas price estimated by the Ethereum node. Return 0 on error.
 
         """
-        r = self.call("eth_gasPrice")
-        if r:
-            return bg(r)
-        return 0
+        return _gas_price(self.call("eth_gasPrice"))
 
     def getChainId(self):
         """
@@ -131,10 +860,41 @@ RPC class
 
     Return the Ethereum network id
         """
-        r = self.call("net_version")
-        if r is not None:
-            return str(r)
-        return 0
+        return _chain_id(self.call("net_version"))
+
+    def getBlockNumber(self):
+        """
+.. method:: getBlockNumber()
+
+    Return the number of the most recent block as integer, -1 on error.
+
+        """
+        return _tx_count(self.call("eth_blockNumber"))
+
+    def getLogs(self,flt):
+        """
+.. method:: getLogs(flt)
+
+    :param flt: a filter object as a dictionary (i.e. :samp:`{"address":address, "fromBlock":"0x1", "toBlock":"0x10", "topics":[...]}`)
+
+    Return the list of logs matching *flt* or None on error.
+
+        """
+        return self.call("eth_getLogs",params=[flt])
+
+    def getFeeHistory(self,blocks,newest="latest",percentiles=()):
+        """
+.. method:: getFeeHistory(blocks,newest="latest",percentiles=())
+
+    :param blocks: number of blocks
+    :param newest: the most recent block of the range
+    :param percentiles: list of percentiles of the priority fees to sample in each block
+
+    Return the fee history of *blocks* blocks up to *newest* as a dictionary with keys :samp:`baseFeePerGas` (including the next block),
+    :samp:`gasUsedRatio` and :samp:`reward` (if *percentiles* is given), or None on error.
+
+        """
+        return self.call("eth_feeHistory",params=[hex(blocks),newest,list(percentiles)])
 
     def getTransactionCount(self,address,block_number="latest"):
         """
@@ -148,24 +908,19 @@ RPC class
         Transaction counts at specific points in time can be retrieved by specifying a different *block_number*.
 
         """
-        r = self.call("eth_getTransactionCount",params=[address,block_number])
-        if r:
-            return int(r,16)
-        return -1
+        return _tx_count(self.call("eth_getTransactionCount",params=[address,block_number]))
 
     def sendTransaction(self,tx,retry=10):
         """
 .. method:: sendTransaction(tx,retry=10)
 
-        :param tx: the hexadecimal hash of a signed transaction
+        :param tx: a signed transaction in RLP form, hexadecimal or binary (bytes, bytearray or memoryview)
         :param retry: the number of retries
 
         Send the raw transaction to the geth node in order to broadcast it to all nodes in the network. If correct, it will be eventually added to a mined block.
 
         """
-        if not tx.startswith("0x"):
-            tx="0x"+tx
-        return self.call("eth_sendRawTransaction",params=[tx],retry=retry)
+        return self.call("eth_sendRawTransaction",params=[_raw_tx(tx)],retry=retry)
 
     def simpleCall(self, tx, block_number="latest",retry=10):
         """
@@ -180,3 +935,318 @@ RPC class
         """
         return self.call("eth_call",params=[tx,block_number],retry=retry)
 
+
+
+class Batch():
+    """
+===========
+Batch class
+===========
+
+.. class:: Batch(rpc)
+
+    Collect many calls to be sent to the node of *rpc* as a single JSON-RPC 2.0 batch request.
+    Batches are usually created with :meth:`RPC.batch`.
+
+    Each call method of the batch (:meth:`getBalance`, :meth:`getGasPrice`, ...) accepts the same arguments of the corresponding
+    :class:`RPC` method, but returns the index of the call inside the batch. Once the batch is sent, results and errors can be retrieved by index
+    with :meth:`result` and :meth:`error`. Results are converted exactly as the corresponding :class:`RPC` method does.
+
+    When used as a context manager, the batch is sent on exit.
+
+    After :meth:`send`, :samp:`answered` is True if the node replied to the calls one by one, even with errors,
+    and False if the whole batch failed (i.e. the node could not be reached).
+
+    """
+    def __init__(self,rpc):
+        self._rpc = rpc
+        self._calls = []
+        self.results = []
+        self.errors = []
+        self.answered = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,tb):
+        if exc_type is None:
+            self.send()
+
+    def add(self,method,params=(),conv=None):
+        """
+.. method:: add(method,params=(),conv=None)
+
+        :param method: the endpoint to call
+        :param params: the list of parameters for the endpoint
+        :param conv: an optional function applied to the :samp:`result` field of the response
+
+        Append a call to the batch and return its index.
+
+        """
+        self._calls.append((method,params,conv))
+        return len(self._calls)-1
+
+    def send(self,retry=10,policy=None):
+        """
+.. method:: send(retry=10,policy=None)
+
+        :param retry: the number of attempts of the whole batch before failing, ignored if a :class:`RetryPolicy` is set
+        :param policy: a :class:`RetryPolicy` for this batch only
+
+        Send all the collected calls in a single request and match the responses back to the calls by :samp:`id`.
+        Return True if every call succeeded. The :samp:`last_error` attribute of the bound :class:`RPC` is reset
+        and then set to the last error encountered, if any.
+
+        """
+        rpc = self._rpc
+        n = len(self._calls)
+        self.results = [None]*n
+        self.errors = [""]*n
+        self.answered = False
+        rpc.last_error = ""
+        if not n:
+            return True
+        js = []
+        for i,call in enumerate(self._calls):
+            js.append(rpc._request(call[0],call[1],i+1))
+
+        rj,error = rpc._exchange(js,retry,policy)
+        if type(rj)!=PLIST:
+            if rj is not None:
+                # the whole batch has been rejected
+                error = rj["error"]["message"] if "error" in rj else rj
+            for i in range(n):
+                self.errors[i] = error
+            rpc.last_error = error
+            return False
+
+        self.answered = True
+        for i in range(n):
+            self.errors[i] = "missing response"
+        for r in rj:
+            if type(r)!=PDICT:
+                continue
+            i = r.get("id")
+            # a null id answers a request the node could not parse
+            if type(i)!=PSMALLINT or i<1 or i>n:
+                continue
+            i-=1
+            if "error" in r:
+                self.errors[i] = r["error"]["message"]
+            elif "result" in r:
+                self.errors[i] = ""
+                conv = self._calls[i][2]
+                self.results[i] = conv(r["result"]) if conv else r["result"]
+            else:
+                self.errors[i] = r
+        ok = True
+        for err in self.errors:
+            if err != "":
+                rpc.last_error = err
+                ok = False
+        return ok
+
+    def result(self,idx):
+        """
+.. method:: result(idx)
+
+        Return the result of the call at index *idx*, or None in case of error.
+
+        """
+        return self.results[idx]
+
+    def error(self,idx):
+        """
+.. method:: error(idx)
+
+        Return the error reason of the call at index *idx*, or an empty string if the call succeeded.
+
+        """
+        return self.errors[idx]
+
+    def getBalance(self,address,block_number="latest"):
+        return self.add("eth_getBalance",[address,block_number])
+
+    def getGasPrice(self):
+        return self.add("eth_gasPrice",(),_gas_price)
+
+    def getChainId(self):
+        return self.add("net_version",(),_chain_id)
+
+    def getBlockNumber(self):
+        return self.add("eth_blockNumber",(),_tx_count)
+
+    def getLogs(self,flt):
+        return self.add("eth_getLogs",[flt])
+
+    def getFeeHistory(self,blocks,newest="latest",percentiles=()):
+        return self.add("eth_feeHistory",[hex(blocks),newest,list(percentiles)])
+
+    def getTransactionCount(self,address,block_number="latest"):
+        return self.add("eth_getTransactionCount",[address,block_number],_tx_count)
+
+    def sendTransaction(self,tx):
+        return self.add("eth_sendRawTransaction",[_raw_tx(tx)])
+
+    def simpleCall(self,tx,block_number="latest"):
+        return self.add("eth_call",[tx,block_number])
+
+
+class RPCPool(RPC):
+    """
+=============
+RPCPool class
+=============
+
+.. class:: RPCPool(hosts,additional_params=dict(),ssl_ctx=None,keep_alive=False,retry_policy=None,cache=None,hedge=False,recovery=30000)
+
+    Initialize a pool of geth nodes from the list *hosts*. The pool has the same methods of :class:`RPC` (including :meth:`RPC.batch`)
+    and every call is sent to the healthiest node of the pool.
+
+    For every node the pool tracks a rolling average of the response time and of the error rate: the node with the lowest
+    response time, weighted by its error rate, is chosen. When an attempt fails the next attempt (as allowed by the retry policy)
+    is sent to the best node not yet tried by the same call, so that a degraded node is skipped immediately.
+    The error rate of a node is halved every *recovery* milliseconds, so that a demoted node is eventually tried again
+    even if the other nodes keep working.
+
+    Streamed calls (:meth:`RPC.stream`) are sent to the healthiest node; if it fails before yielding any element, the next one is tried.
+
+    If *hedge* is True, calls not modifying the blockchain are sent concurrently to the two best nodes and the first
+    successful response is returned.
+
+    Remaining arguments have the same meaning as in :class:`RPC` and apply to every node.
+
+    """
+    def __init__(self,hosts,additional_params=dict(),ssl_ctx=None,keep_alive=False,retry_policy=None,cache=None,hedge=False,recovery=30000):
+        RPC.__init__(self,hosts[0],additional_params,ssl_ctx,False,retry_policy,cache)
+        self.nodes = [RPC(host,additional_params,ssl_ctx,keep_alive) for host in hosts]
+        self.latency = [0]*len(hosts)
+        self.error_rate = [0]*len(hosts)
+        self.recovery = recovery
+        self._seen = [timers.now()]*len(hosts)
+        self.hedge = hedge
+        self._locks = [threading.Lock() for host in hosts]
+
+    def _error(self,idx):
+        # error rate halved for every recovery period since the last update of the node
+        rate = self.error_rate[idx]
+        if rate and self.recovery>0:
+            halvings = (timers.now()-self._seen[idx])//self.recovery
+            if halvings>=10:
+                return 0
+            rate = rate>>halvings
+        return rate
+
+    def _update(self,idx,elapsed,failed):
+        # exponentially weighted moving averages of latency and error rate
+        self.error_rate[idx] = self._error(idx)
+        self._seen[idx] = timers.now()
+        if failed:
+            self.error_rate[idx] = (self.error_rate[idx]*7+1000)//8
+        else:
+            self.error_rate[idx] = (self.error_rate[idx]*7)//8
+            if self.latency[idx]:
+                self.latency[idx] = (self.latency[idx]*7+elapsed)//8
+            else:
+                self.latency[idx] = elapsed
+
+    def _score(self,idx):
+        # error_rate is in thousandths: a node failing every call weighs eleven times its latency
+        return (self.latency[idx]+1)*(1000+10*self._error(idx))
+
+    def ranking(self):
+        """
+.. method:: ranking()
+
+        Return the indexes of the nodes in *nodes*, from the healthiest to the least healthy.
+
+        """
+        res = []
+        for i in range(len(self.nodes)):
+            sc = self._score(i)
+            j = 0
+            while j<len(res) and self._score(res[j])<=sc:
+                j+=1
+            res.insert(j,i)
+        return res
+
+    def _pick(self,n,tried):
+        # return the n best nodes not yet tried by the current call
+        if len(tried)>=len(self.nodes):
+            # all the nodes have failed: start again from the best one
+            while tried:
+                tried.pop()
+        res = []
+        for i in self.ranking():
+            if i not in tried:
+                res.append(i)
+                if len(res)==n:
+                    break
+        return res
+
+    def _post_to(self,idx,js):
+        self._locks[idx].acquire()
+        started = timers.now()
+        try:
+            rj = self.nodes[idx]._post(js)
+        except Exception as e:
+            self._update(idx,0,True)
+            self._locks[idx].release()
+            raise e
+        self._update(idx,timers.now()-started,False)
+        self._locks[idx].release()
+        return rj
+
+    def _hedged(self,idx,js,box,sem):
+        try:
+            box.append(self._post_to(idx,js))
+        except Exception as e:
+            box.append(None)
+        sem.release()
+
+    def _post(self,js,tried=None):
+        if tried is None:
+            tried = []
+        if self.hedge and len(self.nodes)>1 and _is_read(js):
+            best = self._pick(2,tried)
+        else:
+            best = self._pick(1,tried)
+        tried.extend(best)
+        if len(best)==1:
+            return self._post_to(best[0],js)
+        box = []
+        sem = threading.Semaphore(0)
+        for idx in best:
+            thread(self._hedged,idx,js,box,sem)
+        for idx in best:
+            sem.acquire()
+            for rj in box:
+                if rj is not None:
+                    return rj
+        raise IOError
+
+    def stream(self,method,params=(),path=("result",)):
+        self.last_error = ""
+        for idx in self.ranking():
+            node = self.nodes[idx]
+            count = 0
+            for item in node.stream(method,params,path):
+                count+=1
+                yield item
+            self.last_error = node.last_error
+            if self.last_error!="":
+                # the duration depends on the consumer too: only failures are accounted
+                self._update(idx,0,True)
+            # elements already yielded can't be taken back: fail over only if nothing was received
+            if self.last_error=="" or count:
+                return
+
+    def close(self):
+        for node in self.nodes:
+            node.close()
+
+    def handshakes_saved(self):
+        res = 0
+        for node in self.nodes:
+            res+=node.handshakes_saved()
+        return res
@@ -0,0 +1,147 @@
+"""
+Generate a precomputed contract table from a solc ABI file.
+
+This script runs on the host (CPython 3), not on the device. ::
+
+    python3 tools/abigen.py Game.abi game_abi.py
+
+The generated module contains:
+
+* ``FUNCTIONS``: function name -> (selector, arguments plan, return values plan or None if the function has no outputs)
+* ``EVENTS``: event name -> (topic0, parameters plan, indexed flags, anonymous flag)
+
+Plans are the ones produced by ``abi.compile``, frozen as tuple literals. Load the table on the
+device with ``ethereum.Contract.from_table``: no JSON parsing nor Keccak hashing is needed at startup.
+Overloaded functions and events are keyed by name for the first occurrence and by full signature for the following ones.
+
+"""
+
+import builtins
+import importlib.util
+import json
+import os
+import sys
+import types
+
+
+# Keccak-256 as used by Ethereum (original padding, not SHA3-256)
+
+_RC = (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+)
+
+_ROT = (
+    (0, 36, 3, 41, 18),
+    (1, 44, 10, 45, 2),
+    (62, 6, 43, 15, 61),
+    (28, 55, 25, 21, 56),
+    (27, 20, 39, 8, 14),
+)
+
+_MASK = (1 << 64) - 1
+
+
+def _rol(x, n):
+    return ((x << n) | (x >> (64 - n))) & _MASK if n else x
+
+
+def _keccak_f(a):
+    for rc in _RC:
+        c = [a[x][0] ^ a[x][1] ^ a[x][2] ^ a[x][3] ^ a[x][4] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rol(c[(x + 1) % 5], 1) for x in range(5)]
+        a = [[a[x][y] ^ d[x] for y in range(5)] for x in range(5)]
+        b = [[0] * 5 for _ in range(5)]
+        for x in range(5):
+            for y in range(5):
+                b[y][(2 * x + 3 * y) % 5] = _rol(a[x][y], _ROT[x][y])
+        a = [[b[x][y] ^ ((~b[(x + 1) % 5][y]) & b[(x + 2) % 5][y]) for y in range(5)] for x in range(5)]
+        a[0][0] ^= rc
+    return a
+
+
+def keccak256(data):
+    rate = 136
+    data = bytearray(data) + b'\x01'
+    data += b'\x00' * ((-len(data)) % rate)
+    data[-1] |= 0x80
+    a = [[0] * 5 for _ in range(5)]
+    for i in range(0, len(data), rate):
+        for j in range(rate // 8):
+            a[j % 5][j // 5] ^= int.from_bytes(data[i + 8 * j:i + 8 * j + 8], 'little')
+        a = _keccak_f(a)
+    return b''.join(a[j % 5][j // 5].to_bytes(8, 'little') for j in range(4))
+
+
+def _load_abi_module():
+    # abi.py is written for the device: stub the device-only modules it imports,
+    # only the type compilation functions are used here
+    for name in ('PSMALLINT', 'PINTEGER'):
+        setattr(builtins, name, int)
+    builtins.PSTRING = str
+    builtins.UnsupportedError = NotImplementedError
+    for name in ('crypto', 'crypto.ecc', 'crypto.ecc.ecc', 'bignum', 'bignum.bignum'):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules['crypto.ecc'].ecc = sys.modules['crypto.ecc.ecc']
+    sys.modules['bignum'].bignum = sys.modules['bignum.bignum']
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'abi.py')
+    spec = importlib.util.spec_from_file_location('abi', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate(entries, abi):
+    functions = []
+    events = []
+    seen_functions = set()
+    seen_events = set()
+    for entry in entries:
+        kind = entry.get('type', 'function')
+        name = entry.get('name')
+        inputs = tuple(abi.param_type(p) for p in entry.get('inputs', ()))
+        sig = abi.signature(name or '', inputs)
+        if kind == 'function':
+            outputs = tuple(abi.param_type(p) for p in entry.get('outputs', ()))
+            key = sig if name in seen_functions else name
+            seen_functions.add(name)
+            rplan = abi.compile(outputs) if outputs else None
+            functions.append((key, keccak256(sig.encode())[:4], abi.compile(inputs), rplan))
+        elif kind == 'event':
+            indexed = tuple(bool(p.get('indexed')) for p in entry.get('inputs', ()))
+            key = sig if name in seen_events else name
+            seen_events.add(name)
+            events.append((key, keccak256(sig.encode()), abi.compile(inputs), indexed, bool(entry.get('anonymous'))))
+
+    out = ['# generated by tools/abigen.py, do not edit', '', 'FUNCTIONS = {']
+    for key, selector, plan, rplan in functions:
+        out.append('    %r: (%r, %r, %r),' % (key, selector, plan, rplan))
+    out += ['}', '', 'EVENTS = {']
+    for key, topic, plan, indexed, anonymous in events:
+        out.append('    %r: (%r, %r, %r, %r),' % (key, topic, plan, indexed, anonymous))
+    out += ['}', '']
+    return '\n'.join(out)
+
+
+def main(argv):
+    if len(argv) != 3:
+        print('usage: abigen.py <contract.abi> <output.py>')
+        return 1
+    with open(argv[1]) as f:
+        entries = json.load(f)
+    # accept both plain ABI files and solc combined json/artifacts with an "abi" key
+    if isinstance(entries, dict):
+        entries = entries['abi']
+        if isinstance(entries, str):
+            entries = json.loads(entries)
+    with open(argv[2], 'w') as f:
+        f.write(generate(entries, _load_abi_module()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
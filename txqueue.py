@@ -0,0 +1,294 @@
+"""
+.. module:: txqueue
+
+*******
+TxQueue
+*******
+
+This module pipelines the submission of many transactions: while a signed transaction is being sent to the node
+by a background thread, the next one can be signed, so that CPU and network are used at the same time. ::
+
+    from blockchain.ethereum import ethereum
+    from blockchain.ethereum import rpc
+    from blockchain.ethereum import nonce
+    from blockchain.ethereum import txqueue
+
+    ...
+
+    eth = rpc.RPC(config.RPC_URL, ssl_ctx=SSL_CTX, keep_alive=True)
+    q = txqueue.TxQueue(eth, config.PRIVATE_KEY, nonce.NonceManager(eth, config.ADDRESS))
+
+    for value in values:
+        tx = ethereum.Transaction(ethereum.ROPSTEN)
+        tx.set_value(value, ethereum.WEI)
+        tx.set_gas_price(config.GAS_PRICE)
+        tx.set_gas_limit("0x5208")
+        tx.set_receiver(config.RECEIVER_ADDRESS)
+        q.submit(tx)
+
+    for res in q.wait():
+        print(res.nonce, res.hash, res.error)
+
+
+    """
+
+import threading
+import timers
+from crypto.ecc import ecc as ecc
+from blockchain.ethereum import nonce
+
+PENDING = 0
+SENT    = 1
+FAILED  = 2
+
+class TxResult():
+    """
+==============
+TxResult class
+==============
+
+.. class:: TxResult(tx, nonce)
+
+    The outcome of a transaction submitted to a :class:`TxQueue`, with attributes:
+
+    * :samp:`tx`, the :samp:`Transaction`
+    * :samp:`nonce`, the nonce assigned to it
+    * :samp:`status`, one of :samp:`PENDING`, :samp:`SENT`, :samp:`FAILED`
+    * :samp:`hash`, the transaction hash returned by the node once sent
+    * :samp:`error`, the error reason if failed
+    * :samp:`attempts`, the number of times the transaction has been sent (more than one if replaced with a bumped fee)
+
+    """
+    def __init__(self, tx, nonce):
+        self.tx = tx
+        self.nonce = nonce
+        self.status = PENDING
+        self.hash = None
+        self.error = ""
+        self.attempts = 0
+        self.raw = None
+
+
+class TxQueue():
+    """
+=============
+TxQueue class
+=============
+
+.. class:: TxQueue(rpc, key, nonces, max_pending=4, bump=12, replacements=3, hold=5000, max_hold=300000)
+
+    Create a queue sending transactions to the node of *rpc* from a background thread.
+
+    :param rpc: a :ref:`RPC <lib.blockchain.ethereum.rpc>` instance
+    :param key: the private key signing the transactions, in hexadecimal or binary format
+    :param nonces: a :samp:`nonce.NonceManager` handing out nonces locally
+    :param max_pending: maximum number of signed transactions waiting to be sent; :meth:`submit` blocks when reached
+    :param bump: percentage of fee increase when a transaction is replaced
+    :param replacements: maximum number of automatic replacements of a transaction refused as underpriced
+    :param hold: time in milliseconds to wait before sending again a transaction when the node can not be reached
+    :param max_hold: maximum time in milliseconds a transaction is held before failing
+
+    Transactions are sent in submission (and nonce) order. When the node refuses a transaction with "replacement transaction underpriced",
+    it is signed again with a gas price raised by *bump* percent and resent. When the node can not be reached (after the retries of *rpc*),
+    the queue is held and the same signed transaction is sent again every *hold* milliseconds, for at most *max_hold* milliseconds
+    (or until :meth:`stop` is called).
+
+    When the node refuses a transaction, its nonce is not lost: the queued transactions following it are signed again with new nonces,
+    starting from the refused one or, if the node refused the nonce itself (i.e. "nonce too low") or could not be reached, from the transaction count read again from the node.
+
+    Attributes :samp:`sent` and :samp:`failed` count the transactions sent and failed, :samp:`busy_time` is the time in milliseconds
+    spent waiting for the node: comparing it with the total time gives the overlap obtained between signing and sending.
+
+    """
+    def __init__(self, rpc, key, nonces, max_pending=4, bump=12, replacements=3, hold=5000, max_hold=300000):
+        self._rpc = rpc
+        self._key = key
+        self._nonces = nonces
+        self.bump = bump
+        self.replacements = replacements
+        self.hold = hold
+        self.max_hold = max_hold
+        self._stopping = False
+        self._queue = []
+        self._lock = threading.Lock()
+        self._items = threading.Semaphore(0)
+        self._slots = threading.Semaphore(max_pending)
+        self._done = threading.Semaphore(0)
+        self._results = []
+        self._queued = 0
+        self._waited = 0
+        # incremented every time the queued transactions get new nonces
+        self._gen = 0
+        self.sent = 0
+        self.failed = 0
+        self.busy_time = 0
+        thread(self._sender)
+
+    def submit(self, tx):
+        """
+.. method:: submit(tx)
+
+        :param tx: an unsigned :samp:`Transaction` with all fields but the nonce set
+
+        Assign the next nonce to *tx*, sign it in the calling thread and queue it for sending. Return a :class:`TxResult`.
+
+        """
+        self._lock.acquire()
+        try:
+            res = TxResult(tx, self._nonces.next())
+            gen = self._gen
+        finally:
+            self._lock.release()
+        tx.set_nonce(res.nonce)
+        self._sign(res)
+        self._slots.acquire()
+        self._lock.acquire()
+        try:
+            if gen != self._gen:
+                # the nonce has been handed out again while signing
+                self._renonce(res)
+        except Exception as e:
+            self._lock.release()
+            self._slots.release()
+            raise e
+        self._queue.append(res)
+        self._results.append(res)
+        self._queued += 1
+        self._lock.release()
+        self._items.release()
+        return res
+
+    def replace(self, res, bump=None):
+        """
+.. method:: replace(res, bump=None)
+
+        :param res: the :class:`TxResult` of a sent transaction
+        :param bump: percentage of fee increase, default is the queue *bump*
+
+        Queue again the transaction of *res* with the same nonce and a higher gas price (i.e. to speed up a transaction stuck in the mempool).
+
+        """
+        res.tx.bump_fees(self.bump if bump is None else bump)
+        self._sign(res)
+        res.status = PENDING
+        self._slots.acquire()
+        self._lock.acquire()
+        self._queue.append(res)
+        self._queued += 1
+        self._lock.release()
+        self._items.release()
+
+    def _sign(self, res):
+        res.tx.sign(self._key)
+        res.raw = res.tx.to_rlp()
+
+    def _renonce(self, res):
+        res.nonce = self._nonces.next()
+        res.tx.set_nonce(res.nonce)
+        self._sign(res)
+
+    def _send(self, res):
+        bumps = 0
+        held = -1
+        while True:
+            res.attempts += 1
+            started = timers.now()
+            # the error is read from the response: last_error is shared with the other threads using rpc
+            rj, error = self._rpc.response("eth_sendRawTransaction", ["0x"+ecc.bin_to_hex(res.raw)])
+            self.busy_time += timers.now()-started
+            if rj is None:
+                res.error = error
+                if held < 0:
+                    held = started
+                if self._stopping or timers.now()-held >= self.max_hold:
+                    # the transaction may have reached the node: its nonce is read again
+                    self._fail(res, True)
+                    return
+                # the node can not be reached: the same signed transaction is sent again
+                sleep(self.hold)
+                continue
+            if "result" in rj:
+                res.hash = rj["result"]
+            else:
+                res.error = rj["error"]["message"]
+                error = str(res.error).lower()
+                if "already known" in error:
+                    # a previous attempt reached the node
+                    res.hash = "0x"+res.tx.hash().hexdigest()
+                elif "underpriced" in error and bumps < self.replacements:
+                    bumps += 1
+                    res.tx.bump_fees(self.bump)
+                    self._sign(res)
+                    continue
+                else:
+                    self._fail(res, nonce.is_resync_error(res.error))
+                    return
+            res.status = SENT
+            res.error = ""
+            self.sent += 1
+            return
+
+    def _fail(self, res, resync):
+        res.status = FAILED
+        self.failed += 1
+        if res.hash is not None:
+            # a replacement: the nonce is still taken by the transaction sent before
+            return
+        self._lock.acquire()
+        try:
+            self._gen += 1
+            if resync:
+                self._nonces.failed(res.error)
+            else:
+                self._nonces.reset(res.nonce)
+            for queued in self._queue:
+                if queued is not None and queued.hash is None:
+                    self._renonce(queued)
+        except IOError:
+            # the nonce can not be read from the node: the queued transactions will fail and try again
+            pass
+        finally:
+            self._lock.release()
+
+    def _sender(self):
+        while True:
+            self._items.acquire()
+            self._lock.acquire()
+            res = self._queue.pop(0)
+            self._lock.release()
+            self._slots.release()
+            if res is None:
+                break
+            self._send(res)
+            self._done.release()
+
+    def wait(self):
+        """
+.. method:: wait()
+
+        Wait until all the transactions submitted so far have been sent or have failed, and return the list of their :class:`TxResult`.
+
+        """
+        self._lock.acquire()
+        n = self._queued-self._waited
+        self._lock.release()
+        while n > 0:
+            self._done.acquire()
+            self._waited += 1
+            n -= 1
+        return self._results
+
+    def stop(self):
+        """
+.. method:: stop()
+
+        Stop the background thread once the queued transactions have been sent.
+        Transactions held because the node can not be reached fail without waiting further.
+
+        """
+        self._stopping = True
+        self._slots.acquire()
+        self._lock.acquire()
+        self._queue.append(None)
+        self._lock.release()
+        self._items.release()
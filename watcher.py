@@ -0,0 +1,337 @@
+"""
+.. module:: watcher
+
+*******
+Watcher
+*******
+
+This module allows following the blockchain without re-reading its state: new blocks and new contract logs are
+retrieved through node filters, so that each poll only returns what changed since the previous one.
+It also allows waiting for transactions to be mined. ::
+
+    from blockchain.ethereum import rpc
+    from blockchain.ethereum import watcher
+
+    ...
+
+    def new_block(block_hash):
+        print("New block", block_hash)
+
+    def new_log(log):
+        print("Log", log["transactionHash"])
+
+    eth = rpc.RPC(config.RPC_URL, ssl_ctx=SSL_CTX, keep_alive=True)
+    w = watcher.BlockWatcher(eth)
+    w.on_block(new_block)
+    w.on_logs({"address": config.CONTRACT_ADDRESS}, new_log)
+    w.start()
+
+    tx_hash = eth.sendTransaction(tx.to_rlp())
+    receipt = watcher.wait_for_receipt(eth, tx_hash, confirmations=3, block_time=w.block_time)
+
+
+    """
+
+import timers
+
+# default block time of the main network, in milliseconds
+BLOCK_TIME = 12000
+
+class BlockWatcher():
+    """
+==================
+BlockWatcher class
+==================
+
+.. class:: BlockWatcher(rpc, block_time=BLOCK_TIME, min_interval=1000, max_interval=60000)
+
+    Create a watcher polling the node of *rpc* (a :ref:`RPC <lib.blockchain.ethereum.rpc>` instance) for new blocks and logs.
+
+    Watches are backed by node filters (:samp:`eth_newBlockFilter` and :samp:`eth_newFilter`), all polled together with a single
+    batched :samp:`eth_getFilterChanges` request. If the node forgets a filter (i.e. after a restart or a long disconnection), it is recreated
+    transparently; log filters restart from the block following the last log seen.
+
+    The poll interval follows the observed block time: it starts from *block_time* milliseconds, is updated with a moving average of the
+    time between new blocks and polls happen twice per block, within *min_interval* and *max_interval* milliseconds.
+    The current estimate of the block time is available in :samp:`block_time`.
+
+    The reason of the last failed poll is stored in :samp:`last_error`.
+
+    """
+    def __init__(self, rpc, block_time=BLOCK_TIME, min_interval=1000, max_interval=60000):
+        self._rpc = rpc
+        self.block_time = block_time
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._watches = []
+        self._last_block_at = 0
+        self._running = False
+        self.last_error = ""
+
+    def on_block(self, handler):
+        """
+.. method:: on_block(handler)
+
+        Call :samp:`handler(block_hash)` for every new block. Return the watch id.
+
+        """
+        return self._add(None, handler)
+
+    def on_logs(self, flt, handler):
+        """
+.. method:: on_logs(flt, handler)
+
+        :param flt: a filter object as a dictionary (i.e. :samp:`{"address":address, "topics":[...]}`)
+
+        Call :samp:`handler(log)` for every new log matching *flt*. Return the watch id.
+
+        """
+        return self._add(flt, handler)
+
+    def _add(self, flt, handler):
+        # a watch is [filter object, handler, node filter id, last block seen]
+        self._watches.append([flt, handler, None, -1])
+        return len(self._watches)-1
+
+    def remove(self, wid):
+        """
+.. method:: remove(wid)
+
+        Stop the watch with id *wid* and uninstall its node filter.
+
+        """
+        w = self._watches[wid]
+        if w is None:
+            return
+        if w[2] is not None:
+            self._rpc.call("eth_uninstallFilter", [w[2]], retry=1)
+        self._watches[wid] = None
+
+    def _install(self, w):
+        if w[0] is None:
+            w[2], error = self._rpc.request("eth_newBlockFilter")
+        else:
+            flt = {}
+            for k in w[0]:
+                flt[k] = w[0][k]
+            if w[3] >= 0:
+                flt["fromBlock"] = hex(w[3]+1)
+            w[2], error = self._rpc.request("eth_newFilter", [flt])
+        if w[2] is None:
+            self.last_error = error
+            return False
+        return True
+
+    def _new_blocks(self, n):
+        now = timers.now()
+        if self._last_block_at:
+            observed = (now-self._last_block_at)//n
+            self.block_time = (self.block_time*3+observed)//4
+        self._last_block_at = now
+
+    def interval(self):
+        """
+.. method:: interval()
+
+        Return the current poll interval in milliseconds.
+
+        """
+        wait = self.block_time//2
+        if wait < self.min_interval:
+            return self.min_interval
+        if wait > self.max_interval:
+            return self.max_interval
+        return wait
+
+    def poll(self):
+        """
+.. method:: poll()
+
+        Retrieve the changes of all watches since the previous poll and call their handlers.
+        Watches whose node filter can not be installed are skipped and retried at the next poll.
+        Return the number of changes, or -1 if an error occurred and no change was retrieved (the reason is stored in :samp:`last_error`).
+
+        """
+        b = self._rpc.batch()
+        polled = []
+        ok = True
+        for w in self._watches:
+            if w is None:
+                continue
+            if w[2] is None and not self._install(w):
+                ok = False
+                continue
+            polled.append((w, b.add("eth_getFilterChanges", [w[2]])))
+        if not polled:
+            return 0 if ok else -1
+        if not b.send(retry=1):
+            ok = False
+        count = 0
+        blocks = 0
+        for w, idx in polled:
+            changes = b.result(idx)
+            if changes is None:
+                self.last_error = b.error(idx)
+                if "filter not found" in str(self.last_error).lower():
+                    # recreated at next poll
+                    w[2] = None
+                continue
+            for change in changes:
+                if w[0] is None:
+                    blocks += 1
+                else:
+                    bn = change.get("blockNumber")
+                    if bn:
+                        w[3] = int(bn, 16)
+                w[1](change)
+            count += len(changes)
+        if blocks:
+            self._new_blocks(blocks)
+        if not ok and not count:
+            return -1
+        return count
+
+    def _run(self):
+        while self._running:
+            try:
+                self.poll()
+            except Exception as e:
+                # keep polling: a failing handler or node must not stop the watcher
+                self.last_error = str(e)
+            sleep(self.interval())
+
+    def start(self):
+        """
+.. method:: start()
+
+        Start polling in a background thread.
+
+        """
+        if not self._running:
+            self._running = True
+            thread(self._run)
+
+    def stop(self):
+        """
+.. method:: stop()
+
+        Stop the background polling started by :meth:`start`.
+
+        """
+        self._running = False
+
+
+def _int(v):
+    if v is None:
+        return -1
+    return int(v, 16)
+
+class Receipt():
+    """
+=============
+Receipt class
+=============
+
+.. class:: Receipt(receipt)
+
+    Parse the json *receipt* returned by :samp:`eth_getTransactionReceipt`. The following attributes are available:
+
+    * :samp:`tx_hash`, the transaction hash
+    * :samp:`status`, 1 if the transaction succeeded, 0 if it was reverted
+    * :samp:`block_number`, the number of the block including the transaction
+    * :samp:`block_hash`, the hash of the block including the transaction
+    * :samp:`gas_used`, the gas used by the transaction
+    * :samp:`effective_gas_price`, the price paid per unit of gas, -1 if not reported by the node
+    * :samp:`contract_address`, the address of the created contract or None
+    * :samp:`logs`, the list of logs emitted by the transaction (they can be decoded with :samp:`Contract.decode_log`)
+    * :samp:`confirmations`, the number of blocks including and following the block of the transaction when last checked
+
+    """
+    def __init__(self, receipt):
+        self.tx_hash = receipt["transactionHash"]
+        self.status = _int(receipt.get("status"))
+        self.block_number = _int(receipt["blockNumber"])
+        self.block_hash = receipt["blockHash"]
+        self.gas_used = _int(receipt.get("gasUsed"))
+        self.effective_gas_price = _int(receipt.get("effectiveGasPrice"))
+        self.contract_address = receipt.get("contractAddress")
+        self.logs = receipt.get("logs", [])
+        self.confirmations = 0
+
+    def __str__(self):
+        return "Receipt "+self.tx_hash+" status "+str(self.status)+" block "+str(self.block_number)
+
+
+def wait_for_receipts(rpc, tx_hashes, confirmations=1, timeout=300000, block_time=BLOCK_TIME):
+    """
+.. function:: wait_for_receipts(rpc, tx_hashes, confirmations=1, timeout=300000, block_time=BLOCK_TIME)
+
+    :param rpc: a :ref:`RPC <lib.blockchain.ethereum.rpc>` instance
+    :param tx_hashes: a list of transaction hashes as returned by :samp:`rpc.sendTransaction`
+    :param confirmations: the number of blocks (including the one with the transaction) required to consider a transaction mined
+    :param timeout: maximum time to wait in milliseconds
+    :param block_time: the expected block time in milliseconds (i.e. the :samp:`block_time` of a :class:`BlockWatcher`)
+
+    Wait until all the transactions in *tx_hashes* are mined with *confirmations* confirmations or *timeout* expires.
+    Return a list with a :class:`Receipt` for each transaction, or None for transactions not confirmed in time.
+
+    Receipts of all pending transactions and the current block number are read with a single batched request per poll.
+    Polls are spaced by the expected block time: while waiting for confirmations, the next poll is scheduled when the missing blocks are expected.
+    A transaction whose receipt disappears (i.e. after a chain reorganization) goes back to pending.
+
+    """
+    started = timers.now()
+    res = [None]*len(tx_hashes)
+    wait = block_time//2
+    while True:
+        b = rpc.batch()
+        polled = []
+        for i in range(len(tx_hashes)):
+            if res[i] is None or res[i].confirmations < confirmations:
+                polled.append((i, b.add("eth_getTransactionReceipt", [tx_hashes[i]])))
+        if not polled:
+            return res
+        head = b.add("eth_blockNumber")
+        b.send(retry=1)
+        current = _int(b.result(head))
+        missing = 0
+        for i, idx in polled:
+            r = b.result(idx)
+            if r is None:
+                if not b.error(idx):
+                    res[i] = None
+                if res[i] is None:
+                    missing = confirmations
+                elif confirmations-res[i].confirmations > missing:
+                    # the poll failed: the receipt seen before is still short of confirmations
+                    missing = confirmations-res[i].confirmations
+                continue
+            rc = Receipt(r)
+            if current >= rc.block_number >= 0:
+                rc.confirmations = current-rc.block_number+1
+            res[i] = rc
+            if confirmations-rc.confirmations > missing:
+                missing = confirmations-rc.confirmations
+        if missing <= 0:
+            return res
+        elapsed = timers.now()-started
+        if elapsed >= timeout:
+            for i in range(len(res)):
+                if res[i] is not None and res[i].confirmations < confirmations:
+                    res[i] = None
+            return res
+        if current >= 0:
+            wait = missing*block_time
+        if wait > timeout-elapsed:
+            wait = timeout-elapsed
+        sleep(wait)
+
+
+def wait_for_receipt(rpc, tx_hash, confirmations=1, timeout=300000, block_time=BLOCK_TIME):
+    """
+.. function:: wait_for_receipt(rpc, tx_hash, confirmations=1, timeout=300000, block_time=BLOCK_TIME)
+
+    Wait for a single transaction, see :func:`wait_for_receipts`. Return its :class:`Receipt` or None if not confirmed before *timeout*.
+
+    """
+    return wait_for_receipts(rpc, [tx_hash], confirmations, timeout, block_time)[0]